@@ -16,6 +16,8 @@
 #------------------------------------------------------------------------------#
 import sys
 import csv
+import itertools
+import numpy as np
 #------------------------------------------------------------------------------#
 
 
@@ -78,4 +80,44 @@ class FileHandler:
               sys.exit()
 
           return test_data
+
+      # read training data set file in chunks of chunk_rows rows, so that
+      # large files never have to be in memory as a whole
+      def read_training_data_chunks(self, chunk_rows):
+          reader = csv.reader(self.d_file, delimiter=',')
+          try:
+              while True:
+                 chunk = list(itertools.islice(reader, chunk_rows))
+                 if len(chunk) == 0:
+                    return
+                 yield chunk
+          except csv.Error:
+              print("\nError: in reading trainig data file. " +
+                    "exiting gracefully.\n")
+              sys.exit()
+
+      # map a numerical data matrix file without reading it into memory,
+      # either a .npy file or a raw float32 file of cols columns
+      def map_matrix_file(self, file_name, cols=None):
+          try:
+              if file_name.endswith('.npy'):
+                 x_map = np.load(file_name, mmap_mode='r')
+              elif cols != None:
+                 x_map = np.memmap(file_name, dtype=np.float32, mode='r')
+                 x_map = x_map.reshape(-1, cols)
+              else:
+                 print("\nError: the number of columns of the raw matrix " +
+                       "file " + file_name + " is required. exiting " +
+                       "gracefully.\n")
+                 sys.exit()
+          except (IOError, ValueError):
+              print("\nError: in mapping matrix file " + file_name +
+                    ". exiting gracefully.\n")
+              sys.exit()
+
+          if x_map.ndim != 2:
+             print("\nError: the matrix file " + file_name + " is not a " +
+                   "two dimensional matrix. exiting gracefully.\n")
+             sys.exit()
+          return x_map
 #------------------------------------------------------------------------------#
@@ -0,0 +1,105 @@
+################################################################################
+#                                                                              #
+#                              Model Store Module:                             #
+#                                                                              #
+################################################################################
+#                                                                              #
+# This module defines a class ModelStore which saves learned models to disk    #
+# and loads them back, so that a run can make predictions without training.    #
+#                                                                              #
+# A model is keyed by the learner kind, its hyperparameters and a hash of the  #
+# training data file. Every model is a directory holding one .npy file per     #
+# array, which are loaded memory-mapped, and a small meta.json file for        #
+# everything which is not an array.                                            #
+#                                                                              #
+################################################################################
+
+
+
+#------------------------------------------------------------------------------#
+# import built-in system modules here                                          #
+#------------------------------------------------------------------------------#
+import os
+import sys
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# bump whenever the arrays or the meta data of a model change meaning          #
+#------------------------------------------------------------------------------#
+MODEL_FORMAT_VERSION = 1
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# class ModelStore                                                             #
+#------------------------------------------------------------------------------#
+class ModelStore:
+      # data members
+      store_dir = None
+
+      # init method
+      def __init__(self, store_dir='./model_store'):
+          self.store_dir = store_dir
+
+      # sha-256 hash of the contents of a file
+      def get_file_hash(self, file_name):
+          sha = hashlib.sha256()
+          with open(file_name, 'rb') as f:
+               for chunk in iter(lambda: f.read(1 << 20), b''):
+                   sha.update(chunk)
+          return sha.hexdigest()
+
+      # key of the model learned by the given kind of learner, with the given
+      # hyperparameters, from the given training data file
+      def get_model_key(self, kind, params, d_file):
+          key = json.dumps({'version': MODEL_FORMAT_VERSION, 'kind': kind,
+                            'params': params,
+                            'data': self.get_file_hash(d_file)},
+                           sort_keys=True)
+          return hashlib.sha256(key.encode()).hexdigest()
+
+      def get_model_dir(self, key):
+          return os.path.join(self.store_dir, key)
+
+      def has_model(self, key):
+          return os.path.isfile(os.path.join(self.get_model_dir(key),
+                                             'meta.json'))
+
+      # save the arrays and the meta data of a model, the model directory is
+      # written aside and moved in place at once, so that a crashed run never
+      # leaves a half written model behind
+      def save_model(self, key, arrays, meta):
+          os.makedirs(self.store_dir, exist_ok=True)
+          tmp_dir = tempfile.mkdtemp(dir=self.store_dir)
+          try:
+              for name, arr in arrays.items():
+                  np.save(os.path.join(tmp_dir, name + '.npy'),
+                          np.asarray(arr))
+              with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+                   json.dump({'arrays': list(arrays.keys()), 'meta': meta}, f)
+              model_dir = self.get_model_dir(key)
+              if os.path.isdir(model_dir):
+                 shutil.rmtree(model_dir)
+              os.rename(tmp_dir, model_dir)
+          except OSError:
+              shutil.rmtree(tmp_dir, ignore_errors=True)
+              print("\nWarning: could not save the learned model to " +
+                    self.store_dir + ".\n")
+
+      # load the arrays, memory-mapped, and the meta data of a model
+      def load_model(self, key):
+          model_dir = self.get_model_dir(key)
+          with open(os.path.join(model_dir, 'meta.json'), 'r') as f:
+               saved = json.load(f)
+          arrays = {}
+          for name in saved['arrays']:
+              arrays[name] = np.load(os.path.join(model_dir, name + '.npy'),
+                                     mmap_mode='r')
+          return arrays, saved['meta']
+#------------------------------------------------------------------------------#
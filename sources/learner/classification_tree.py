@@ -20,8 +20,6 @@
 import sys
 import numpy as np
 import math
-import matplotlib.pyplot as plt
-from PIL import Image, ImageDraw
 #------------------------------------------------------------------------------#
 
 
@@ -29,6 +27,9 @@ from PIL import Image, ImageDraw
 # import package modules here                                                  #
 #------------------------------------------------------------------------------#
 import sources.utility.util as util
+import sources.learner.columnar_data_set as cds
+import sources.learner.histogram_split as hs
+import sources.learner.flat_tree as ft
 #------------------------------------------------------------------------------#
 
 
@@ -59,16 +60,16 @@ class DNode:
 # CART tree classifier                                                         #
 #------------------------------------------------------------------------------#
 class CART:
-      def get_value_count(self, data_set, col):
-          values = {}
-          if len(data_set) == 0:
-             return values
-          for row in data_set:
-              value = row[col]
-              if value not in values:
-                 values[value] = 0
-              values[value] += 1
-          return values
+      # data members
+      split_engine = None
+      max_bins = None
+
+      # split_engine is either 'exact', which tries every distinct value of
+      # every column, or 'histogram', which bins every column once into at
+      # most max_bins buckets
+      def __init__(self, split_engine='exact', max_bins=255):
+          self.split_engine = split_engine
+          self.max_bins = max_bins
 
       def get_results_count(self, data_set):
           results = {}
@@ -104,76 +105,6 @@ class CART:
       def compute_impurity(self, data_set):
           return self.compute_entropy(data_set)
 
-      def binary_classify_based_on_value_comparison(self, data_set, col, value):
-          set1 = []
-          set2 = []
-          for row in data_set:
-              if row[col] >= value:
-                 set1.append(row)
-              else:
-                 set2.append(row)
-          return set1, set2
-
-      def banary_classfy_based_on_value_equality(self, data_set, col, value):
-          set1 = []
-          set2 = []
-          for row in data_set:
-              if row[col] == value:
-                 set1.append(row)
-              else:
-                 set2.append(row)
-          return set1, set2
-
-      def binary_classify_data_set(self, data_set, col, value):
-          binary_classifier = None
-          if isinstance(value, int) or isinstance(value, float):
-             binary_classifier = self.binary_classify_based_on_value_comparison
-          else:
-             binary_classifier = self.banary_classfy_based_on_value_equality
-          return binary_classifier(data_set, col, value)
-
-      def get_best_partition(self, data_set):
-          set_impurity = self.compute_impurity(data_set)
-          col_count = len(data_set[0]) - 1
-          best_gain = 0.0;
-          best_combination = None
-          best_partition = None
-          for col in range(0, col_count):
-              values = self.get_value_count(data_set, col)
-              for k in values.keys():
-                  # there are missing values, simply skip over these values
-                  if k == '?':
-                     continue
-                  set1, set2 = self.binary_classify_data_set(data_set, col, k)
-                  set1_impurity = self.compute_impurity(set1)
-                  set2_impurity = self.compute_impurity(set2)
-                  p = float(len(set1)) / float(len(data_set))
-                  weighted_impurity = (p * set1_impurity) + \
-                                                   ((1-p) * set2_impurity)
-                  gain = set_impurity - weighted_impurity
-                  if gain > best_gain and len(set1) > 0 and len(set2) > 0:
-                     best_gain = gain
-                     best_combination = (col, k)
-                     best_partition = (set1, set2)
-          return best_gain, best_combination, best_partition
-
-      def recursive_build_tree(self, data_set):
-          if len(data_set) == 0:
-             return DNode(leaf_node=True)
-
-          best_gain, best_combination, best_partition = \
-                                               self.get_best_partition(data_set)
-          if best_gain > 0.0:
-             tb = self.recursive_build_tree(best_partition[0])
-             fb = self.recursive_build_tree(best_partition[1])
-             pnode = DNode(col=best_combination[0], value=best_combination[1], \
-                           tnode=tb, fnode=fb, leaf_node=False)
-             return pnode
-          else:
-             results_dict = self.get_results_count(data_set)
-             lnode = DNode(results=results_dict, leaf_node=True)
-             return lnode
-
       def prune_tree(self, tree, min_gain):
           if tree.leaf_node == False:
              if tree.tnode != None:
@@ -199,8 +130,33 @@ class CART:
                    tree.results = self.get_results_count(tb+fb)
           return tree
 
-      def build_tree(self, data_set):
-          root = self.recursive_build_tree(data_set)
+      # without max_bins every distinct value of a column is a bin of its
+      # own, which makes the histogram search exact
+      def get_max_bins(self):
+          if self.split_engine == 'histogram':
+             return self.max_bins
+          return None
+
+      # grow the tree over the given rows of the binned data set
+      def recursive_build_tree(self, splitter, index):
+          best_gain, best_combination, best_partition = \
+                                         splitter.get_best_partition(index)
+          if best_gain > 0.0:
+             tb = self.recursive_build_tree(splitter, best_partition[0])
+             fb = self.recursive_build_tree(splitter, best_partition[1])
+             pnode = DNode(col=best_combination[0], value=best_combination[1], \
+                           tnode=tb, fnode=fb, leaf_node=False)
+             return pnode
+          else:
+             results_dict = splitter.get_results(index)
+             lnode = DNode(results=results_dict, leaf_node=True)
+             return lnode
+
+      def build_tree(self, c_data):
+          binner = hs.FeatureBinner(self.get_max_bins()).fit(c_data)
+          splitter = hs.HistogramSplitter(binner)
+          index = np.arange(c_data.rows)
+          root = self.recursive_build_tree(splitter, index)
           root = self.prune_tree(root, 1.0)
           return root
 #------------------------------------------------------------------------------#
@@ -210,10 +166,25 @@ class CART:
 # ClassificationTree Class                                                     #
 #------------------------------------------------------------------------------#
 class ClassificationTree:
+      # data members
+      split_engine = None
+      max_bins = None
+      c_data = None
+
+      # init method
+      def __init__(self, split_engine='exact', max_bins=255):
+          self.split_engine = split_engine
+          self.max_bins = max_bins
+
       # contruct the classification tree for training data
       def build_tree(self, data_set):
-          cart = CART()
-          return cart.build_tree(data_set)
+          if len(data_set) == 0:
+             return DNode(leaf_node=True)
+
+          # keep the columnar training data, test data is encoded the same way
+          self.c_data = cds.ColumnarDataSet().fit(data_set)
+          cart = CART(self.split_engine, self.max_bins)
+          return cart.build_tree(self.c_data)
 
       # preprocess the data set
       def preprocess_data_set(self, data_set):
@@ -242,51 +213,30 @@ class ClassificationTree:
               gene_list.append(row[0])
           return gene_list
 
-      def get_class(self, results):
-          cur_v = 0
-          cur_k = None
-          for k, v in results.items():
-              if v > cur_v:
-                 cur_v = v
-                 cur_k = k
-          return cur_k
-
-      def select_branch_based_on_value_comparison(self, tree, row):
-          node = None
-          t_col = tree.col
-          t_val = tree.value
-          if row[t_col] >= t_val:
-             node = tree.tnode
-          else:
-             node = tree.fnode
-          return node
-
-      def select_branch_based_on_value_equality(self, tree, row):
-          node = None
-          t_col = tree.col
-          t_val = tree.value
-          if row[t_col] == t_val:
-             node = tree.tnode
-          else:
-             node = tree.fnode
-          return node
-
-      def select_branch(self, tree, row):
-          cur_select_branch = None
-          t_val = tree.value
-          if isinstance(t_val, int) or isinstance(t_val, float):
-             cur_select_branch = self.select_branch_based_on_value_comparison
-          else:
-             cur_select_branch = self.select_branch_based_on_value_equality
-          return cur_select_branch(tree, row)
-
-      # recusrively classify the given test data item
-      def recursive_classify(self, tree, row):
-          if tree.leaf_node == False:
-             node = self.select_branch(tree, row)
-             return self.recursive_classify(node, row)
-          else:
-             return tree
+      # hyperparameters which change the learned tree
+      def get_params(self):
+          return {'split_engine': self.split_engine,
+                  'max_bins': self.max_bins}
+
+      # compile a learned tree, loaded trees are compiled already
+      def compile_tree(self, root):
+          if isinstance(root, ft.FlatTree):
+             return root
+          return ft.FlatTree().compile(root, self.c_data)
+
+      # arrays and meta data to save the learned tree in a model store
+      def get_model_arrays(self, root):
+          arrays = self.compile_tree(root).get_arrays()
+          numeric, categories, classes = self.c_data.get_encoding()
+          arrays['numeric_cols'] = numeric
+          meta = {'categories': categories, 'classes': classes}
+          return arrays, meta
+
+      # restore the tree saved by get_model_arrays, as a compiled tree
+      def set_model_arrays(self, arrays, meta):
+          self.c_data = cds.ColumnarDataSet().set_encoding(
+                     arrays['numeric_cols'], meta['categories'], meta['classes'])
+          return ft.FlatTree().set_arrays(arrays)
 
       # classify the test data
       def classify(self, root, test_data):
@@ -296,13 +246,14 @@ class ClassificationTree:
          # preprocess test data
          processed_test_data = self.preprocess_data_set(test_data)
 
-         # classify test data
+         # classify all rows of the test data at once on the compiled tree
+         x_mat = self.c_data.transform(processed_test_data)
+         class_codes = self.compile_tree(root).predict(x_mat)
+
          class_dict = {}
          for r in range(0, len(processed_test_data)):
-             row = processed_test_data[r]
-             node = self.recursive_classify(root, row)
              cur_gene = gene_list[r]
-             class_dict[cur_gene] = self.get_class(node.results)
+             class_dict[cur_gene] = self.c_data.classes[class_codes[r]]
          return class_dict
 
       # ask classification tree learner to learn from training data
@@ -0,0 +1,131 @@
+################################################################################
+#                                                                              #
+#                          Columnar Data Set:                                  #
+#                                                                              #
+################################################################################
+#                                                                              #
+# This module defines a class ColumnarDataSet which holds a data set column    #
+# wise, for the tree learners.                                                 #
+#                                                                              #
+# Every feature is stored as one NumPy array. Numerical features keep their    #
+# values, categorical features are replaced by dense integer codes, and the    #
+# class label (last column) is stored as an integer coded vector. Tree nodes   #
+# then refer to their rows through index arrays into these columns instead of #
+# copied lists of rows.                                                        #
+#                                                                              #
+################################################################################
+
+
+
+#------------------------------------------------------------------------------#
+# import built-in system modules here                                          #
+#------------------------------------------------------------------------------#
+import sys
+import numpy as np
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# encode values into dense integer codes, in order of first occurrence         #
+#------------------------------------------------------------------------------#
+def encode_values(values):
+    codes = {}
+    coded = np.empty(len(values), dtype=np.int64)
+    for r in range(0, len(values)):
+        value = values[r]
+        if value not in codes:
+           codes[value] = len(codes)
+        coded[r] = codes[value]
+    return coded, codes
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# ColumnarDataSet Class                                                        #
+#------------------------------------------------------------------------------#
+class ColumnarDataSet:
+      # data members
+      rows = None
+      columns = None
+      numeric = None
+      categories = None
+      codes = None
+      labels = None
+      classes = None
+      class_codes = None
+
+      # numerical columns keep their values, categorical columns are integer
+      # coded, codes[col] maps the categories to their codes and
+      # categories[col] maps the codes back to the categories
+      def encode_column(self, values):
+          if isinstance(values[0], int):
+             return np.asarray(values, dtype=np.int64), None, True
+          elif isinstance(values[0], float):
+             return np.asarray(values, dtype=np.float64), None, True
+          else:
+             return encode_values(values) + (False,)
+
+      # split the data set into columns, last column is the class label
+      def fit(self, data_set):
+          self.rows = len(data_set)
+          col_count = len(data_set[0]) - 1
+          columns = list(zip(*data_set))
+
+          self.columns = []
+          self.numeric = np.zeros(col_count, dtype=bool)
+          self.categories = []
+          self.codes = []
+          for col in range(0, col_count):
+              column, codes, numeric = self.encode_column(columns[col])
+              self.columns.append(column)
+              self.numeric[col] = numeric
+              self.codes.append(codes)
+              self.categories.append(None if numeric else list(codes.keys()))
+
+          self.labels, self.class_codes = encode_values(columns[col_count])
+          self.classes = list(self.class_codes.keys())
+          return self
+
+      # the encoding of the fitted data set, without its rows
+      def get_encoding(self):
+          return self.numeric, self.categories, self.classes
+
+      # restore the encoding returned by get_encoding, so that new rows can
+      # be transformed without the data set it was fitted on
+      def set_encoding(self, numeric, categories, classes):
+          self.numeric = np.asarray(numeric, dtype=bool)
+          self.categories = categories
+          self.codes = []
+          for col in range(0, len(categories)):
+              if categories[col] == None:
+                 self.codes.append(None)
+              else:
+                 self.codes.append({categories[col][c]: c
+                                    for c in range(0, len(categories[col]))})
+          self.classes = classes
+          self.class_codes = {classes[c]: c for c in range(0, len(classes))}
+          return self
+
+      # features of the fitted data set as a single matrix, encoded like the
+      # matrices returned by transform
+      def get_matrix(self):
+          x_mat = np.empty((self.rows, len(self.columns)), dtype=np.float64)
+          for col in range(0, len(self.columns)):
+              x_mat[:, col] = self.columns[col]
+          return x_mat
+
+      # encode the features of new rows, like test data, the same way as the
+      # fitted data set into a single matrix, categories which were never
+      # seen get the code -1
+      def transform(self, data_set):
+          col_count = len(self.numeric)
+          x_mat = np.empty((len(data_set), col_count), dtype=np.float64)
+          columns = list(zip(*data_set))
+          for col in range(0, col_count):
+              if self.numeric[col]:
+                 x_mat[:, col] = columns[col]
+              else:
+                 codes = self.codes[col]
+                 x_mat[:, col] = [codes.get(v, -1) for v in columns[col]]
+          return x_mat
+#------------------------------------------------------------------------------#
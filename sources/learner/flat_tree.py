@@ -0,0 +1,129 @@
+################################################################################
+#                                                                              #
+#                             Flat Tree Model:                                 #
+#                                                                              #
+################################################################################
+#                                                                              #
+# This module defines a class FlatTree which compiles a tree of DNode objects  #
+# learned by the CART learners into parallel NumPy arrays.                     #
+#                                                                              #
+# Node i of the compiled tree splits on column feature[i]. Numerical nodes     #
+# send a row to left[i] if 'value >= threshold[i]', categorical nodes if       #
+# 'code == threshold[i]', every other row goes to right[i]. Leaves have        #
+# feature[i] == -1 and their class counts in dist[i].                          #
+#                                                                              #
+# predict pushes all the rows down the tree together, one level at a time,     #
+# using fancy indexing instead of walking the tree row by row.                 #
+#                                                                              #
+################################################################################
+
+
+
+#------------------------------------------------------------------------------#
+# import built-in system modules here                                          #
+#------------------------------------------------------------------------------#
+import sys
+import numpy as np
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# FlatTree Class                                                               #
+#------------------------------------------------------------------------------#
+class FlatTree:
+      # data members
+      feature = None
+      numeric = None
+      threshold = None
+      left = None
+      right = None
+      dist = None
+
+      # number the nodes in pre-order and link every node to its children
+      def number_nodes(self, root):
+          nodes = []
+          left = []
+          right = []
+          stack = [(root, -1, True)]
+          while len(stack) > 0:
+             tree, parent, is_left = stack.pop()
+             i = len(nodes)
+             nodes.append(tree)
+             left.append(-1)
+             right.append(-1)
+             if parent >= 0:
+                if is_left:
+                   left[parent] = i
+                else:
+                   right[parent] = i
+             if tree.leaf_node == False:
+                stack.append((tree.fnode, i, False))
+                stack.append((tree.tnode, i, True))
+          return nodes, left, right
+
+      # compile a tree of DNode objects, learned from the columnar data set
+      # c_data, into flat arrays
+      def compile(self, root, c_data):
+          nodes, left, right = self.number_nodes(root)
+
+          n = len(nodes)
+          self.feature = np.full(n, -1, dtype=np.int64)
+          self.numeric = np.zeros(n, dtype=bool)
+          self.threshold = np.zeros(n, dtype=np.float64)
+          self.left = np.array(left, dtype=np.int64)
+          self.right = np.array(right, dtype=np.int64)
+          self.dist = np.zeros((n, len(c_data.classes)), dtype=np.float64)
+
+          for i in range(0, n):
+              tree = nodes[i]
+              if tree.leaf_node == False:
+                 col = tree.col
+                 self.feature[i] = col
+                 self.numeric[i] = c_data.numeric[col]
+                 if c_data.numeric[col]:
+                    self.threshold[i] = tree.value
+                 else:
+                    self.threshold[i] = c_data.codes[col][tree.value]
+              elif tree.results != None:
+                 for k, v in tree.results.items():
+                     self.dist[i, c_data.class_codes[k]] = v
+          return self
+
+      # arrays of the compiled tree, keyed by name
+      def get_arrays(self):
+          return {'feature': self.feature, 'numeric': self.numeric,
+                  'threshold': self.threshold, 'left': self.left,
+                  'right': self.right, 'dist': self.dist}
+
+      # restore a compiled tree from the arrays returned by get_arrays
+      def set_arrays(self, arrays):
+          self.feature = arrays['feature']
+          self.numeric = arrays['numeric']
+          self.threshold = arrays['threshold']
+          self.left = arrays['left']
+          self.right = arrays['right']
+          self.dist = arrays['dist']
+          return self
+
+      # leaf node reached by each row of the encoded matrix x_mat
+      def apply(self, x_mat):
+          rows = np.arange(len(x_mat))
+          node = np.zeros(len(x_mat), dtype=np.int64)
+          active = rows[self.feature[node] >= 0]
+          while len(active) > 0:
+             cur = node[active]
+             x = x_mat[active, self.feature[cur]]
+             go_left = np.where(self.numeric[cur], x >= self.threshold[cur],
+                                x == self.threshold[cur])
+             node[active] = np.where(go_left, self.left[cur], self.right[cur])
+             active = active[self.feature[node[active]] >= 0]
+          return node
+
+      # class counts of the leaf reached by each row
+      def predict_dist(self, x_mat):
+          return self.dist[self.apply(x_mat)]
+
+      # predicted class code of each row, the most frequent class of its leaf
+      def predict(self, x_mat):
+          return np.argmax(self.predict_dist(x_mat), axis=1)
+#------------------------------------------------------------------------------#
@@ -14,12 +14,7 @@
 # import built-in system modules here                                          #
 #------------------------------------------------------------------------------#
 import sys
-import copy
 import numpy as np
-from collections import OrderedDict
-from queue import PriorityQueue
-from scipy.spatial import distance as sci_dist
-import matplotlib.pyplot as plt
 #------------------------------------------------------------------------------#
 
 
@@ -27,109 +22,565 @@ import matplotlib.pyplot as plt
 # import package modules here                                                  #
 #------------------------------------------------------------------------------#
 import sources.utility.util as util
+import sources.utility.distance_kernel as dk
+import sources.learner.k_mean_clustering as kmc
 #------------------------------------------------------------------------------#
 
 
 
 #------------------------------------------------------------------------------#
-# single linkage clustering                                                    #
-#------------------------------------------------------------------------------#
-class SingleLinkageCluster:
-      # find two closest clusters
-      def find_two_closest_clusters(self, i_mat, rows, cols, cluster,
-                                    distance):
-         dist = float("inf")
-         c1 = -1
-         c2 = -1
-         for key, qu in distance.items():
-             tu = qu.get()
-             if tu[0] <  dist:
-                dist = tu[0]
-                c1 = key
-                c2 = tu[1]
-         return c1, c2
-
-      # merge two clusters which are closer to each other
-      def merge_two_closest_clusters(self, cluster, c1, c2):
-         # construct a new merged cluster from old cluster by
-         # merging c2 into c1
-         n_cluster = {}
-         for key, v_list in cluster.items():
-             nv_list = copy.deepcopy(v_list)
-             n_cluster[key] = nv_list
-         v1_list = n_cluster[c1]
-         v2_list = n_cluster[c2]
-         v1_list.extend(v2_list)
-         n_cluster[c1] = v1_list
-         del n_cluster[c2]
-         return n_cluster
-
-      # merge clusters 
-      def merge_clusters(self, i_mat, rows, cols, cluster, distance):
-         # find two closest clusters
-         c1, c2 = self.find_two_closest_clusters(i_mat, rows, cols, cluster,
-                                                 distance)
-         # merge c1 and c2
-         cluster = self.merge_two_closest_clusters(cluster, c1, c2)
-         return cluster
-
-      # compute shortest distance between two given clusters
-      def find_distance_between_two_clusters(self, v_list1, v_list2, i_mat,
-                                             rows, cols, cluster):
-          dist = float("inf")
-          for v1 in v_list1:
-              for v2 in v_list2:
-                  n_dist = sci_dist.euclidean(i_mat[v1], i_mat[v2])
-                  if n_dist < dist:
-                     dist = n_dist
-          return dist
-
-      # compute distance between all clusters
-      def compute_distance(self, i_mat, rows, cols, cluster):
-          distance = {}
-          for key1, v_list1 in cluster.items():
-              distance[key1] = PriorityQueue()
-              for key2, v_list2 in cluster.items():
-                  if key1 != key2:
-                     dist = self.find_distance_between_two_clusters(
-                                   v_list1, v_list2, i_mat, rows, cols, cluster)
-                     distance[key1].put((dist, key2))
-          return distance
-
-      # construct initial singleton clusters
-      def get_initial_singleton_cluster(self, i_mat, rows, cols):
-          cluster = {i: [] for i in range(rows)}
-          for i in range(0, rows):
-              cluster[i].append(i)
-
-          return cluster
-
-      # perform hierarchical clustering using single linkage technique
-      def single_linkage_clustering(self, i_mat):
-          # get rows and cols
-          rows = len(i_mat)
-          cols = len(i_mat[0])
-
-          # construct initial singleton clusters
-          cluster = self.get_initial_singleton_cluster(i_mat, rows, cols)
-
-          # initialize empty cluster list
-          cluster_list = []
-          cluster_list.append(cluster)
-
-          # iterate till all clusters merges into a single cluster
-          while len(cluster) > 1:
-              # compute (shortest) distances among clusters
-              distance = self.compute_distance(i_mat, rows, cols, cluster)
-
-              # merge two clusters which are closer to each other
-              cluster = self.merge_clusters(i_mat, rows, cols, cluster,
-                                            distance)
-
-              # append the current cluster to cluster list
-              cluster_list.append(cluster)
-
-          return cluster_list
+# positions in a condensed matrix of the distances of sample i to all the n    #
+# samples, the position of i to itself is -1                                   #
+#------------------------------------------------------------------------------#
+def get_condensed_row(n, i):
+    j = np.arange(n)
+    lo = np.minimum(i, j)
+    hi = np.maximum(i, j)
+    index = n * lo - lo * (lo + 1) // 2 + (hi - lo - 1)
+    index[i] = -1
+    return index
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# agglomerative clustering on a condensed distance matrix                      #
+#                                                                              #
+# the pairwise distances are computed once. after every merge, the distances   #
+# of the merged cluster to all the other clusters are updated in O(n) with the #
+# Lance-Williams formula of the linkage, 'single', 'complete', 'average',      #
+# 'weighted' or 'ward'. every cluster caches its nearest neighbor, so finding  #
+# the closest pair only rescans the rows whose nearest neighbor was merged.    #
+#                                                                              #
+# the merged cluster takes the slot (key) of the lower of the two clusters,    #
+# and merges are returned as (kept key, merged key, distance, size) tuples     #
+#------------------------------------------------------------------------------#
+class LanceWilliamsCluster:
+      # data members
+      linkage = None
+
+      # init method
+      def __init__(self, linkage='single'):
+          if linkage not in ['single', 'complete', 'average', 'weighted',
+                             'ward']:
+             print("\nError: unknown linkage " + str(linkage) +
+                   ". exiting gracefully.\n")
+             sys.exit()
+          self.linkage = linkage
+
+      # distances of the merged cluster a + b to the clusters k, from their
+      # distances d_ka and d_kb to a and b, of sizes n_k, n_a and n_b, and
+      # the distance d_ab of a and b
+      def update_distances(self, d_ka, d_kb, d_ab, n_k, n_a, n_b):
+          if self.linkage == 'single':
+             return np.minimum(d_ka, d_kb)
+          elif self.linkage == 'complete':
+             return np.maximum(d_ka, d_kb)
+          elif self.linkage == 'average':
+             return (n_a * d_ka + n_b * d_kb) / (n_a + n_b)
+          elif self.linkage == 'weighted':
+             return 0.5 * (d_ka + d_kb)
+          else:
+             sq = ((n_k + n_a) * np.square(d_ka) + (n_k + n_b) *
+                   np.square(d_kb) - n_k * np.square(d_ab)) / (n_k + n_a + n_b)
+             return np.sqrt(np.maximum(sq, 0.0))
+
+      # nearest active neighbor of cluster i, the lowest key among ties
+      def find_nearest(self, d_arr, n, active, i):
+          index = get_condensed_row(n, i)
+          row = np.where(active, d_arr[index], np.inf)
+          row[i] = np.inf
+          j = int(np.argmin(row))
+          return j, row[j]
+
+      # merge the clusters till a single one is left
+      def linkage_clustering(self, i_mat):
+          d_arr = dk.compute_condensed_distances(i_mat)
+          return self.linkage_clustering_from(d_arr, np.ones(len(i_mat)))
+
+      # merge clusters of the given sizes, at the given condensed distances,
+      # till a single one is left, d_arr is updated in place
+      def linkage_clustering_from(self, d_arr, size):
+          n = len(size)
+          active = np.ones(n, dtype=bool)
+          size = np.array(size, dtype=np.int64)
+
+          nn = np.zeros(n, dtype=np.int64)
+          nn_dist = np.full(n, np.inf)
+          for i in range(0, n):
+              nn[i], nn_dist[i] = self.find_nearest(d_arr, n, active, i)
+
+          merges = []
+          for step in range(0, n - 1):
+              # closest pair, the lowest key among ties keeps the cluster
+              a = int(np.argmin(np.where(active, nn_dist, np.inf)))
+              b = int(nn[a])
+              dist = nn_dist[a]
+              a, b = min(a, b), max(a, b)
+
+              # update the distances of a + b, stored in the row of a
+              others = np.flatnonzero(active)
+              others = others[(others != a) & (others != b)]
+              row_a = get_condensed_row(n, a)[others]
+              row_b = get_condensed_row(n, b)[others]
+              d_arr[row_a] = self.update_distances(d_arr[row_a], d_arr[row_b],
+                                                   dist, size[others], size[a],
+                                                   size[b])
+              active[b] = False
+              size[a] += size[b]
+              merges.append((a, b, dist, int(size[a])))
+
+              # the clusters whose nearest neighbor was merged keep a + b as
+              # nearest neighbor unless it got farther, as always with single
+              # linkage, and only those are rescanned, the others can only
+              # get closer to a + b
+              nn_dist[b] = np.inf
+              d_new = d_arr[row_a]
+              o_nn = nn[others]
+              o_dist = nn_dist[others]
+              merged = (o_nn == a) | (o_nn == b)
+              rescan = merged & (d_new > o_dist)
+              closer = (merged & ~rescan) | \
+                       (d_new < o_dist) | ((d_new == o_dist) & (a < o_nn))
+              nn[others[closer]] = a
+              nn_dist[others[closer]] = d_new[closer]
+              for k in others[rescan]:
+                  nn[k], nn_dist[k] = self.find_nearest(d_arr, n, active, k)
+              if len(others) > 0:
+                 nn[a], nn_dist[a] = self.find_nearest(d_arr, n, active, a)
+              else:
+                 nn_dist[a] = np.inf
+          return merges
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# rows of samples whose distances to a sample are computed at once by the      #
+# minimum spanning tree engine                                                 #
+#------------------------------------------------------------------------------#
+MST_BLOCK_ROWS = 1 << 16
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# merges in increasing distance from unordered merges (u, v, dist) of samples  #
+# u and v of the two clusters, like the edges of a minimum spanning tree: the  #
+# clusters are merged with a union-find keyed by the lowest sample of every    #
+# cluster, like LanceWilliamsCluster, starting from clusters of the given      #
+# sizes                                                                        #
+#------------------------------------------------------------------------------#
+def get_sorted_merges(u, v, dist, size):
+    root = np.arange(len(size))
+    size = np.array(size, dtype=np.int64)
+
+    def find(i):
+        while root[i] != i:
+           root[i] = root[root[i]]
+           i = root[i]
+        return i
+
+    merges = []
+    for e in np.argsort(dist, kind='stable'):
+        a = find(u[e])
+        b = find(v[e])
+        a, b = min(a, b), max(a, b)
+        root[b] = a
+        size[a] += size[b]
+        merges.append((int(a), int(b), dist[e], int(size[a])))
+    return merges
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# single linkage clustering through a minimum spanning tree                    #
+#                                                                              #
+# single linkage merges along the edges of the minimum spanning tree of the    #
+# complete graph of the samples. Prim's algorithm grows that tree one sample   #
+# at a time, computing the distances of the newly added sample to the samples  #
+# not yet in the tree on the fly, block_rows rows at a time. it takes O(n^2)   #
+# time but, besides a copy of the samples, only O(n) memory, no distance       #
+# matrix at all                                                                #
+#------------------------------------------------------------------------------#
+class MSTSingleLinkageCluster:
+      # data members
+      block_rows = None
+
+      # init method
+      def __init__(self, block_rows=MST_BLOCK_ROWS):
+          self.block_rows = block_rows
+
+      # edges (u, v, dist) of the minimum spanning tree of the samples
+      def minimum_spanning_tree(self, i_mat):
+          n = len(i_mat)
+          u = np.empty(n - 1, dtype=np.int64)
+          v = np.empty(n - 1, dtype=np.int64)
+          dist = np.empty(n - 1)
+
+          # samples not yet in the tree, compacted to the first m rows by
+          # moving the last of them into the place of every sample added
+          x_rem = np.array(i_mat[1:], dtype=np.float64)
+          remaining = np.arange(1, n)
+          best = np.full(n - 1, np.inf)
+          parent = np.zeros(n - 1, dtype=np.int64)
+          current = np.asarray(i_mat[0], dtype=np.float64)
+          c = 0
+          m = n - 1
+          for step in range(0, n - 1):
+              # closest tree sample of every remaining sample
+              for s in range(0, m, self.block_rows):
+                  e = min(m, s + self.block_rows)
+                  d_vec = dk.compute_paired_distances(x_rem[s:e], current)
+                  closer = d_vec < best[s:e]
+                  best[s:e][closer] = d_vec[closer]
+                  parent[s:e][closer] = c
+
+              # add the remaining sample closest to the tree
+              j = int(np.argmin(best[:m]))
+              u[step] = parent[j]
+              v[step] = remaining[j]
+              dist[step] = best[j]
+              c = int(remaining[j])
+              current = x_rem[j].copy()
+
+              m -= 1
+              x_rem[j] = x_rem[m]
+              remaining[j] = remaining[m]
+              best[j] = best[m]
+              parent[j] = parent[m]
+          return u, v, dist
+
+      # merge the clusters till a single one is left
+      def linkage_clustering(self, i_mat):
+          u, v, dist = self.minimum_spanning_tree(i_mat)
+          return get_sorted_merges(u, v, dist, np.ones(len(i_mat)))
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# nearest-neighbor-chain clustering                                            #
+#                                                                              #
+# for the reducible linkages 'single', 'complete', 'average', 'weighted' and   #
+# 'ward', mutual nearest neighbors can be merged in any order without changing #
+# the hierarchy. a chain is grown from any cluster to its nearest neighbor,    #
+# to that one's nearest neighbor and so on, till the last two clusters are     #
+# nearest to each other, and they are merged with the Lance-Williams update.   #
+# the chain is then kept, so every cluster enters it once per merge at most,   #
+# which takes O(n^2) time on the condensed distances. merges come out of       #
+# order and are sorted by distance at the end                                  #
+#------------------------------------------------------------------------------#
+class NNChainCluster:
+      # data members
+      lwc = None
+
+      # init method
+      def __init__(self, linkage='average'):
+          self.lwc = LanceWilliamsCluster(linkage)
+
+      # merge the clusters till a single one is left
+      def linkage_clustering(self, i_mat):
+          d_arr = dk.compute_condensed_distances(i_mat)
+          return self.linkage_clustering_from(d_arr, np.ones(len(i_mat)))
+
+      # merge clusters of the given sizes, at the given condensed distances,
+      # till a single one is left, d_arr is updated in place
+      def linkage_clustering_from(self, d_arr, size):
+          n = len(size)
+          active = np.ones(n, dtype=bool)
+          start_size = size
+          size = np.array(size, dtype=np.int64)
+
+          u = np.empty(n - 1, dtype=np.int64)
+          v = np.empty(n - 1, dtype=np.int64)
+          dist = np.empty(n - 1)
+          chain = []
+          for step in range(0, n - 1):
+              if len(chain) == 0:
+                 chain.append(int(np.argmax(active)))
+
+              # grow the chain till its last two clusters are mutual nearest
+              # neighbors, on ties the previous cluster of the chain wins
+              while True:
+                 x = chain[-1]
+                 row = np.where(active, d_arr[get_condensed_row(n, x)], np.inf)
+                 row[x] = np.inf
+                 y = int(np.argmin(row))
+                 if len(chain) > 1 and row[chain[-2]] == row[y]:
+                    y = chain[-2]
+                 if len(chain) > 1 and y == chain[-2]:
+                    break
+                 chain.append(y)
+
+              b = chain.pop()
+              a = chain.pop()
+              a, b = min(a, b), max(a, b)
+              d_ab = row[y]
+
+              # update the distances of a + b, stored in the row of a
+              others = np.flatnonzero(active)
+              others = others[(others != a) & (others != b)]
+              row_a = get_condensed_row(n, a)[others]
+              row_b = get_condensed_row(n, b)[others]
+              d_arr[row_a] = self.lwc.update_distances(d_arr[row_a],
+                                                       d_arr[row_b], d_ab,
+                                                       size[others], size[a],
+                                                       size[b])
+              active[b] = False
+              size[a] += size[b]
+              u[step] = a
+              v[step] = b
+              dist[step] = d_ab
+          return get_sorted_merges(u, v, dist, start_size)
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# condensed distances of micro-clusters summarized by their counts, linear     #
+# sums and sums of squared norms: distances of their centroids for 'single',   #
+# ward distances for 'ward', and for the other linkages the root mean squared  #
+# distance of their samples, which the summaries give exactly                  #
+#------------------------------------------------------------------------------#
+def compute_summary_distances(counts, lin_sums, sq_sums, linkage):
+    m = len(counts)
+    c_mat = lin_sums / counts[:, None]
+    var = sq_sums / counts - np.einsum('ij,ij->i', c_mat, c_mat)
+    d_arr = np.empty(m * (m - 1) // 2)
+    s = 0
+    for i in range(0, m - 1):
+        e = s + m - i - 1
+        d_mat = c_mat[i+1:] - c_mat[i]
+        sq = np.einsum('ij,ij->i', d_mat, d_mat)
+        if linkage == 'ward':
+           sq *= 2.0 * counts[i] * counts[i+1:] / (counts[i] + counts[i+1:])
+        elif linkage != 'single':
+           sq += var[i] + var[i+1:]
+        d_arr[s:e] = np.sqrt(np.maximum(sq, 0.0))
+        s = e
+    return d_arr
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# Lloyd iterations of the k-mean clustering into micro-clusters, which only    #
+# need to summarize the samples, not to converge                               #
+#------------------------------------------------------------------------------#
+MICRO_ITERATIONS = 20
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# two-stage hierarchical clustering                                            #
+#                                                                              #
+# k-mean clustering first compresses the samples into n_micro micro-clusters,  #
+# each summarized by its count, linear sum and sum of squared norms, and the   #
+# agglomeration only runs on those summaries, starting from their counts as    #
+# sizes. the micro-cluster of every sample is kept, so that the hierarchy of   #
+# the micro-clusters still labels every sample                                 #
+#------------------------------------------------------------------------------#
+class TwoStageCluster:
+      # data members
+      linkage = None
+      engine = None
+      n_micro = None
+      seed = None
+
+      # init method, engine is 'nn_chain' or 'lance_williams', 'mst' needs
+      # the samples themselves and cannot agglomerate summaries
+      def __init__(self, linkage='single', engine='nn_chain',
+                   n_micro=1000, seed=None):
+          self.linkage = linkage
+          self.engine = engine
+          self.n_micro = n_micro
+          self.seed = seed
+
+      # micro-cluster of every sample and the summaries of the micro-clusters
+      def summarize(self, i_mat):
+          m = min(self.n_micro, len(i_mat))
+          centroids = kmc.get_initial_cluster_centroids(i_mat, m, 'k-means||',
+                                                        self.seed)
+          c_mat = np.array([centroids[j] for j in range(0, m)])
+          hkm = kmc.HamerlyKMC(max_iterations=MICRO_ITERATIONS)
+          micro_labels, c_mat, keys = hkm.k_mean_cluster_from(i_mat, c_mat,
+                                                              np.arange(m))
+          lin_sums, counts = kmc.compute_centroid_sums(i_mat, micro_labels,
+                                                       len(c_mat))
+          sq_sums = np.bincount(micro_labels,
+                                weights=np.einsum('ij,ij->i', i_mat, i_mat),
+                                minlength=len(c_mat))
+          return micro_labels, counts, lin_sums, sq_sums
+
+      # the clustering engine of the micro-clusters
+      def get_engine(self):
+          if self.engine == 'nn_chain':
+             return NNChainCluster(self.linkage)
+          elif self.engine == 'lance_williams':
+             return LanceWilliamsCluster(self.linkage)
+          print("\nError: the engine " + str(self.engine) + " cannot " +
+                "cluster micro-clusters. exiting gracefully.\n")
+          sys.exit()
+
+      # agglomerate the micro-clusters
+      def hierarchical_cluster(self, i_mat):
+          engine = self.get_engine()
+          micro_labels, counts, lin_sums, sq_sums = self.summarize(i_mat)
+          d_arr = compute_summary_distances(counts, lin_sums, sq_sums,
+                                            self.linkage)
+          merges = engine.linkage_clustering_from(d_arr, counts)
+          return SummaryHierarchy(get_linkage_matrix(merges, len(counts)),
+                                  len(counts), micro_labels, counts, lin_sums,
+                                  sq_sums)
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# linkage matrix of the merges returned by the clustering engines: row i of    #
+# the (n-1) x 4 matrix merges nodes z[i, 0] and z[i, 1] at distance z[i, 2]    #
+# into node n + i of z[i, 3] samples, nodes 0, ..., n-1 being the samples      #
+#------------------------------------------------------------------------------#
+def get_linkage_matrix(merges, rows):
+    z_mat = np.empty((len(merges), 4))
+    node = np.arange(rows)
+    for i in range(0, len(merges)):
+        c1, c2, dist, size = merges[i]
+        z_mat[i] = [node[c1], node[c2], dist, size]
+        node[c1] = rows + i
+    return z_mat
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# ClusterHierarchy Class                                                       #
+#                                                                              #
+# the result of hierarchical clustering, held as a linkage matrix only. flat   #
+# clusterings, cut at k clusters or at a distance, and any level of the        #
+# hierarchy are rebuilt with a union-find when they are asked for              #
+#------------------------------------------------------------------------------#
+class ClusterHierarchy:
+      # data members
+      rows = None
+      z_mat = None
+
+      # init method
+      def __init__(self, z_mat, rows):
+          self.z_mat = z_mat
+          self.rows = rows
+
+      # lowest sample of every node, it keys the cluster of the node
+      def get_node_keys(self):
+          keys = np.arange(self.rows + len(self.z_mat))
+          for i in range(0, len(self.z_mat)):
+              keys[self.rows + i] = min(keys[int(self.z_mat[i, 0])],
+                                        keys[int(self.z_mat[i, 1])])
+          return keys
+
+      # key of the cluster of every sample after the merges selected by the
+      # boolean mask merged
+      def get_sample_keys(self, merged):
+          keys = self.get_node_keys()
+          root = np.arange(self.rows)
+          for i in np.flatnonzero(merged):
+              a = keys[int(self.z_mat[i, 0])]
+              b = keys[int(self.z_mat[i, 1])]
+              root[max(a, b)] = min(a, b)
+          # point every sample straight at its root
+          while True:
+             n_root = root[root]
+             if np.array_equal(n_root, root):
+                return root
+             root = n_root
+
+      # flat clustering of k clusters, labels 0, ..., k-1 in order of the
+      # lowest sample of every cluster
+      def cut_at_k(self, k):
+          k = min(max(k, 1), self.rows)
+          merged = np.arange(len(self.z_mat)) < self.rows - k
+          return np.unique(self.get_sample_keys(merged), return_inverse=True)[1]
+
+      # flat clustering where every merge at a distance up to threshold is
+      # made
+      def cut_at_distance(self, threshold):
+          merged = self.z_mat[:, 2] <= threshold
+          return np.unique(self.get_sample_keys(merged), return_inverse=True)[1]
+
+      # samples of a node, in the order in which they were merged
+      def get_members(self, node):
+          members = []
+          stack = [node]
+          while len(stack) > 0:
+             node = stack.pop()
+             if node < self.rows:
+                members.append(node)
+             else:
+                stack.append(int(self.z_mat[node - self.rows, 1]))
+                stack.append(int(self.z_mat[node - self.rows, 0]))
+          return members
+
+      # nodes which are not merged yet after the first merge_count merges
+      def get_level_nodes(self, merge_count):
+          top = np.ones(self.rows + merge_count, dtype=bool)
+          top[self.z_mat[:merge_count, :2].astype(np.int64)] = False
+          return np.flatnonzero(top)
+
+      # clusters after the first merge_count merges, keyed by their lowest
+      # sample
+      def get_level(self, merge_count):
+          keys = self.get_node_keys()
+          nodes = sorted(self.get_level_nodes(merge_count),
+                         key=lambda node: keys[node])
+          return {int(keys[node]): self.get_members(int(node))
+                  for node in nodes}
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# SummaryHierarchy Class                                                       #
+#                                                                              #
+# the hierarchy of the micro-clusters of TwoStageCluster, its nodes 0, ...,    #
+# m-1 are the micro-clusters. flat clusterings and members are given for the   #
+# samples, through the micro-cluster of every sample, in O(n)                  #
+#------------------------------------------------------------------------------#
+class SummaryHierarchy(ClusterHierarchy):
+      # data members
+      micro_labels = None
+      counts = None
+      lin_sums = None
+      sq_sums = None
+
+      # init method
+      def __init__(self, z_mat, rows, micro_labels, counts, lin_sums,
+                   sq_sums):
+          ClusterHierarchy.__init__(self, z_mat, rows)
+          self.micro_labels = micro_labels
+          self.counts = counts
+          self.lin_sums = lin_sums
+          self.sq_sums = sq_sums
+
+      # flat clustering of the samples into k clusters
+      def cut_at_k(self, k):
+          return ClusterHierarchy.cut_at_k(self, k)[self.micro_labels]
+
+      # flat clustering of the samples, merging up to threshold
+      def cut_at_distance(self, threshold):
+          labels = ClusterHierarchy.cut_at_distance(self, threshold)
+          return labels[self.micro_labels]
+
+      # samples of a node
+      def get_members(self, node):
+          micro = ClusterHierarchy.get_members(self, node)
+          return np.flatnonzero(np.isin(self.micro_labels, micro)).tolist()
+
+      # clusters of samples after the first merge_count merges, keyed by
+      # their lowest sample
+      def get_level(self, merge_count):
+          nodes = self.get_level_nodes(merge_count)
+          micro_cluster = np.empty(self.rows, dtype=np.int64)
+          for c in range(0, len(nodes)):
+              micro = ClusterHierarchy.get_members(self, int(nodes[c]))
+              micro_cluster[micro] = c
+          labels = micro_cluster[self.micro_labels]
+          order = np.argsort(labels, kind='stable')
+          ends = np.cumsum(np.bincount(labels, minlength=len(nodes)))
+          groups = [g for g in np.split(order, ends[:-1]) if len(g) > 0]
+          groups.sort(key=lambda g: g[0])
+          return {int(g[0]): g.tolist() for g in groups}
 #------------------------------------------------------------------------------#
 
 
@@ -137,10 +588,46 @@ class SingleLinkageCluster:
 # Class HierarchicalCluster: which implements hierarchical clustering          #
 #------------------------------------------------------------------------------#
 class HierarchicalCluster:
+      # data members
+      linkage = None
+      engine = None
+      n_micro = None
+      seed = None
+
+      # init method, linkage is 'single', 'complete', 'average', 'weighted'
+      # or 'ward'. engine is 'lance_williams' or 'nn_chain', on a distance
+      # matrix, or 'mst', without one, for single linkage only. data sets of
+      # more than n_micro samples, if given, are first compressed into
+      # n_micro micro-clusters, seeded with seed
+      def __init__(self, linkage='single', engine='nn_chain',
+                   n_micro=None, seed=None):
+          self.linkage = linkage
+          self.engine = engine
+          self.n_micro = n_micro
+          self.seed = seed
+
+      # the clustering engine
+      def get_engine(self):
+          if self.engine == 'lance_williams':
+             return LanceWilliamsCluster(self.linkage)
+          elif self.engine == 'nn_chain':
+             return NNChainCluster(self.linkage)
+          elif self.engine == 'mst' and self.linkage == 'single':
+             return MSTSingleLinkageCluster()
+          print("\nError: the engine " + str(self.engine) + " does not " +
+                "support " + str(self.linkage) + " linkage. exiting " +
+                "gracefully.\n")
+          sys.exit()
+
       # cluster data in hierarchical form
       def hierarchical_cluster(self, i_mat):
-          slc = SingleLinkageCluster()
-          return slc.single_linkage_clustering(i_mat)
+          if self.n_micro != None and len(i_mat) > self.n_micro:
+             tsc = TwoStageCluster(self.linkage, self.engine, self.n_micro,
+                                   self.seed)
+             return tsc.hierarchical_cluster(i_mat)
+          merges = self.get_engine().linkage_clustering(i_mat)
+          return ClusterHierarchy(get_linkage_matrix(merges, len(i_mat)),
+                                  len(i_mat))
 
       # normalize input matrix
       def normalize_input_matrix(self, i_mat):
@@ -167,7 +654,7 @@ class HierarchicalCluster:
           i_mat = self.construct_input_matrix(data)
 
           # get cluster hierarchy
-          cluster_list = self.hierarchical_cluster(i_mat)
+          hierarchy = self.hierarchical_cluster(i_mat)
 
-          return cluster_list
+          return hierarchy
 #------------------------------------------------------------------------------#
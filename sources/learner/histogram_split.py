@@ -0,0 +1,280 @@
+################################################################################
+#                                                                              #
+#                      Histogram Based Split Search Engine:                    #
+#                                                                              #
+################################################################################
+#                                                                              #
+# This module implements a histogram based split search engine for the CART    #
+# learners.                                                                    #
+#                                                                              #
+# Every feature of a ColumnarDataSet is binned exactly once into at most       #
+# max_bins buckets. While growing the tree, each node builds class-count       #
+# histograms over the bins of its rows and scans the (cumulative) counts to    #
+# score every candidate split in a single pass. Finding a split then costs     #
+# O(rows + bins x classes) per feature instead of O(values x rows).            #
+#                                                                              #
+# Without max_bins every distinct value is a bin of its own and the search is  #
+# exact, this is how the 'exact' split engine of the CART learners works.      #
+#                                                                              #
+# Rows may carry weights, like the bootstrap sample counts of a random forest  #
+# tree, which then replace the unit counts in the histograms.                  #
+#                                                                              #
+# Numerical features are split as 'value >= threshold' and categorical         #
+# features as 'value == category', exactly like the CART learners do.          #
+#                                                                              #
+################################################################################
+
+
+
+#------------------------------------------------------------------------------#
+# import built-in system modules here                                          #
+#------------------------------------------------------------------------------#
+import sys
+import numpy as np
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# missing values are never used as split values                                #
+#------------------------------------------------------------------------------#
+MISSING_VALUE = '?'
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# gains below this are treated as floating point noise                         #
+#------------------------------------------------------------------------------#
+MIN_GAIN = 1e-12
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# maximum number of (row, feature) cells gathered at once while building       #
+# histograms                                                                   #
+#------------------------------------------------------------------------------#
+BLOCK_CELLS = 1 << 22
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# compute entropy of each row of a class count matrix                          #
+#------------------------------------------------------------------------------#
+def entropy_of_counts(counts, totals):
+    p = np.zeros(counts.shape)
+    nz = totals > 0
+    p[nz] = counts[nz] / totals[nz][:, None]
+    plogp = np.zeros(counts.shape)
+    mask = p > 0
+    plogp[mask] = p[mask] * np.log2(p[mask])
+    return -np.sum(plogp, axis=1)
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# FeatureBinner Class - bins every feature of the data set once                #
+#------------------------------------------------------------------------------#
+class FeatureBinner:
+      # data members
+      max_bins = None
+      bin_mat = None
+      numeric = None
+      n_bins = None
+      bin_values = None
+      candidate = None
+      offsets = None
+      classes = None
+      labels = None
+
+      def __init__(self, max_bins=255):
+          self.max_bins = max_bins
+
+      # bin a numerical column into at most max_bins quantile buckets, bin b
+      # holds the values in [bin_values[b], bin_values[b+1]), without max_bins
+      # every distinct value gets a bin of its own
+      def bin_numeric_column(self, values):
+          arr = values.astype(np.float64)
+          thresholds = np.unique(arr)
+          if self.max_bins != None and len(thresholds) > self.max_bins:
+             s_arr = np.sort(arr)
+             pos = (np.arange(self.max_bins) * len(s_arr)) // self.max_bins
+             thresholds = np.unique(s_arr[pos])
+          bins = np.searchsorted(thresholds, arr, side='right') - 1
+
+          # keep thresholds in the type of the original values, so that the
+          # tree nodes compare exactly like the rows they are built from
+          cast = int if values.dtype.kind == 'i' else float
+          bin_values = [cast(t) for t in thresholds]
+
+          # 'value >= bin_values[0]' holds for every row
+          candidate = np.ones(len(bin_values), dtype=bool)
+          candidate[0] = False
+          return bins, bin_values, candidate
+
+      # every category of a categorical column is a bin of its own
+      def bin_categorical_column(self, codes, categories):
+          candidate = np.array([v != MISSING_VALUE for v in categories],
+                               dtype=bool)
+          return codes, list(categories), candidate
+
+      # bin all the features of the columnar data set
+      def fit(self, c_data):
+          col_count = len(c_data.columns)
+
+          self.numeric = c_data.numeric.copy()
+          self.n_bins = np.zeros(col_count, dtype=np.int64)
+          self.bin_values = []
+          candidates = []
+          bin_columns = []
+          for col in range(0, col_count):
+              if self.numeric[col]:
+                 bins, bin_values, candidate = \
+                             self.bin_numeric_column(c_data.columns[col])
+              else:
+                 bins, bin_values, candidate = self.bin_categorical_column(
+                             c_data.columns[col], c_data.categories[col])
+              bin_columns.append(bins)
+              self.bin_values.append(bin_values)
+              self.n_bins[col] = len(bin_values)
+              candidates.append(candidate)
+
+          # store bins column wise, so that a node reads each feature from
+          # contiguous memory
+          dtype = np.min_scalar_type(max(int(np.max(self.n_bins)) - 1, 0))
+          self.bin_mat = np.empty((c_data.rows, col_count), dtype=dtype,
+                                  order='F')
+          for col in range(0, col_count):
+              self.bin_mat[:, col] = bin_columns[col]
+
+          self.candidate = np.concatenate(candidates)
+          self.offsets = np.concatenate(([0], np.cumsum(self.n_bins)))
+          self.labels = c_data.labels
+          self.classes = c_data.classes
+          return self
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# HistogramSplitter Class - finds the best split of a tree node                #
+#------------------------------------------------------------------------------#
+class HistogramSplitter:
+      # data members
+      binner = None
+      labels = None
+      n_classes = None
+
+      def __init__(self, binner):
+          self.binner = binner
+          self.labels = binner.labels
+          self.n_classes = len(binner.classes)
+
+      # weights of the given rows, weights holds one weight (like a bootstrap
+      # sample count) for every row of the data set, None weighs all rows 1
+      def get_row_weights(self, index, weights):
+          if weights is None:
+             return None
+          return weights[index]
+
+      # class counts of the given rows
+      def get_results_count(self, index, weights=None):
+          w = self.get_row_weights(index, weights)
+          return np.bincount(self.labels[index], weights=w,
+                             minlength=self.n_classes)
+
+      # class distribution of the given rows, keyed by class label
+      def get_results(self, index, weights=None):
+          counts = self.get_results_count(index, weights)
+          results = {}
+          for c in range(0, self.n_classes):
+              if counts[c] > 0:
+                 results[self.binner.classes[c]] = int(counts[c])
+          return results
+
+      # build class count histograms of the given rows over the bins of the
+      # given columns, laid out one column after the other
+      def build_histogram(self, index, cols, y, w):
+          nc = self.n_classes
+          n_bins = self.binner.n_bins[cols]
+          local_offsets = np.concatenate(([0], np.cumsum(n_bins)))
+          g_mat = self.binner.bin_mat[np.ix_(index, cols)].astype(np.int64)
+          g_mat += local_offsets[:-1]
+          g_mat *= nc
+          g_mat += y[:, None]
+          if w is not None:
+             w = np.repeat(w, len(cols))
+          hist = np.bincount(g_mat.ravel(), weights=w,
+                             minlength=local_offsets[-1] * nc)
+          return hist.reshape(local_offsets[-1], nc), local_offsets
+
+      # score every candidate split of the given columns in a single pass
+      def score_columns(self, index, cols, y, w, parent, parent_impurity):
+          binner = self.binner
+          hist, local_offsets = self.build_histogram(index, cols, y, w)
+          n_bins = binner.n_bins[cols]
+
+          # global bin ids, in the binner layout, of the histogram rows
+          bin_ids = np.repeat(binner.offsets[cols] - local_offsets[:-1],
+                              n_bins) + np.arange(local_offsets[-1])
+          seg_end = np.repeat(local_offsets[1:], n_bins)
+          numeric = np.repeat(binner.numeric[cols], n_bins)
+
+          # rows with 'bin >= b' for numerical columns are given by suffix
+          # sums of the histogram within each column
+          suffix = np.zeros((local_offsets[-1] + 1, self.n_classes),
+                            dtype=hist.dtype)
+          suffix[:-1] = np.cumsum(hist[::-1], axis=0)[::-1]
+          t_counts = np.where(numeric[:, None],
+                              suffix[:-1] - suffix[seg_end], hist)
+          f_counts = parent - t_counts
+
+          n = float(np.sum(parent))
+          nt = np.sum(t_counts, axis=1).astype(np.float64)
+          nf = n - nt
+          t_impurity = entropy_of_counts(t_counts, nt)
+          f_impurity = entropy_of_counts(f_counts, nf)
+          gain = parent_impurity - ((nt / n) * t_impurity + \
+                                    (nf / n) * f_impurity)
+
+          valid = binner.candidate[bin_ids] & (nt > 0) & (nf > 0)
+          gain = np.where(valid, gain, -np.inf)
+          b = int(np.argmax(gain))
+          col = int(cols[np.searchsorted(local_offsets, b, side='right') - 1])
+          return gain[b], col, int(bin_ids[b] - binner.offsets[col])
+
+      # find the best partition of the given rows among the given columns
+      def get_best_partition(self, index, cols=None, weights=None):
+          binner = self.binner
+          if cols is None:
+             cols = np.arange(len(binner.n_bins))
+          cols = np.asarray(cols, dtype=np.int64)
+
+          y = self.labels[index]
+          w = self.get_row_weights(index, weights)
+          parent = np.bincount(y, weights=w, minlength=self.n_classes)
+          parent_impurity = entropy_of_counts(parent[None, :],
+                                      np.array([float(np.sum(parent))]))[0]
+
+          best_gain = 0.0
+          best_combination = None
+          best_partition = None
+
+          # gather the bins of the node in blocks of columns to bound memory
+          block = max(1, BLOCK_CELLS // max(1, len(index)))
+          for s in range(0, len(cols), block):
+              gain, col, b = self.score_columns(index, cols[s:s+block], y, w,
+                                                parent, parent_impurity)
+              if gain > best_gain + MIN_GAIN:
+                 best_gain = gain
+                 best_combination = (col, b)
+
+          if best_combination != None:
+             col, b = best_combination
+             bins = binner.bin_mat[:, col][index]
+             if binner.numeric[col]:
+                mask = bins >= b
+             else:
+                mask = bins == b
+             best_partition = (index[mask], index[~mask])
+             best_combination = (col, binner.bin_values[col][b])
+
+          return best_gain, best_combination, best_partition
+#------------------------------------------------------------------------------#
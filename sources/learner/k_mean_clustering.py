@@ -4,7 +4,9 @@
 #                                                                              #
 ################################################################################
 #                                                                              #
-# This module implements k-mean clustering                                     #
+# This module implements k-mean clustering. Besides the plain Lloyd engine,    #
+# the Hamerly and Elkan engines find the same clusters while skipping the      #
+# distances which their distance bounds prove unnecessary.                     #
 #                                                                              #
 ################################################################################
 
@@ -13,11 +15,13 @@
 #------------------------------------------------------------------------------#
 # import built-in system modules here                                          #
 #------------------------------------------------------------------------------#
+import os
 import sys
+import time
+import random
+import tempfile
 import numpy as np
-from collections import OrderedDict
-from scipy.spatial import distance as sci_dist
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
 #------------------------------------------------------------------------------#
 
 
@@ -25,204 +29,1094 @@ import matplotlib.pyplot as plt
 # import package modules here                                                  #
 #------------------------------------------------------------------------------#
 import sources.utility.util as util
+import sources.utility.distance_kernel as dk
 #------------------------------------------------------------------------------#
 
 
 #------------------------------------------------------------------------------#
-# compute initial cluster centroids
+# memory budget, in bytes, of the block of the sample to centroid distance     #
+# matrix computed at once                                                      #
+#------------------------------------------------------------------------------#
+ASSIGN_BLOCK_BYTES = 64 << 20
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# the Elkan engine computes all the distances of a sample in one matrix        #
+# product, rather than the few the bounds leave open, once more than this      #
+# fraction of its distances are open                                           #
+#------------------------------------------------------------------------------#
+DENSE_FRACTION = 0.125
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# the Elkan engine falls back to the Lloyd assignment when, past the first     #
+# LLOYD_WARMUP bounded assignments, its bounds leave more than LLOYD_FRACTION  #
+# of the samples open                                                          #
+#------------------------------------------------------------------------------#
+LLOYD_WARMUP = 5
+LLOYD_FRACTION = 0.25
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# find the closest centroid (row of c_mat) of every sample (row of i_mat) and  #
+# its squared distance. squared distances are computed block by block as       #
+# ||x||^2 - 2 x.c + ||c||^2, so that the bulk of the work is a single matrix   #
+# multiply per block                                                           #
+#------------------------------------------------------------------------------#
+def compute_closest_centroids(i_mat, c_mat, block_bytes=ASSIGN_BLOCK_BYTES):
+    rows = len(i_mat)
+    k = len(c_mat)
+    c_sq = np.einsum('ij,ij->i', c_mat, c_mat)
+    block = max(1, block_bytes // (8 * k))
+
+    labels = np.empty(rows, dtype=np.int64)
+    sq_dist = np.empty(rows)
+    for s in range(0, rows, block):
+        x_mat = i_mat[s:s+block]
+        d_mat = np.dot(x_mat, c_mat.T)
+        d_mat *= -2.0
+        d_mat += c_sq
+        b_labels = np.argmin(d_mat, axis=1)
+        b_dist = d_mat[np.arange(len(x_mat)), b_labels]
+        b_dist += np.einsum('ij,ij->i', x_mat, x_mat)
+        labels[s:s+block] = b_labels
+        sq_dist[s:s+block] = np.maximum(b_dist, 0.0)
+    return labels, sq_dist
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# draw count indices with probability proportional to their weights, uniformly #
+# if all the weights are zero                                                  #
+#------------------------------------------------------------------------------#
+def choose_weighted_indices(rng, weights, count):
+    cum = np.cumsum(weights)
+    if cum[-1] <= 0.0:
+       return rng.integers(len(weights), size=count)
+    index = np.searchsorted(cum, rng.random(count) * cum[-1], side='right')
+    return np.minimum(index, len(weights) - 1)
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# k-means++ seeding: the first centroid is a random sample, every next one a   #
+# sample drawn with probability proportional to its squared distance to the    #
+# closest centroid drawn so far, times its weight if the samples are weighted. #
+# each step draws 2 + log(k) candidates and keeps the one which lowers the sum #
+# of squared distances most                                                    #
+#------------------------------------------------------------------------------#
+def seed_k_mean_plus_plus(i_mat, k, rng, weights=None):
+    if weights is None:
+       weights = np.ones(len(i_mat))
+    trials = 2 + int(np.log(k))
+    index = np.empty(k, dtype=np.int64)
+    index[0] = choose_weighted_indices(rng, weights, 1)[0]
+    sq_dist = compute_closest_centroids(i_mat, i_mat[index[:1]])[1]
+    for j in range(1, k):
+        cand = choose_weighted_indices(rng, weights * sq_dist, trials)
+        d_mat = dk.compute_pairwise_distances(i_mat, i_mat[cand],
+                                             'sqeuclidean')
+        d_mat = np.minimum(d_mat, sq_dist[:, None])
+        best = np.argmin(np.dot(weights, d_mat))
+        index[j] = cand[best]
+        sq_dist = d_mat[:, best]
+    return i_mat[index]
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# k-means|| seeding, for large data sets: instead of k passes over the data,   #
+# a few rounds each draw every sample independently with probability           #
+# oversampling * squared distance / total squared distance. the candidates,    #
+# weighted by the number of samples closest to them, are then reduced to k     #
+# centroids with k-means++                                                     #
+#------------------------------------------------------------------------------#
+def seed_k_mean_parallel(i_mat, k, rng, rounds=5, oversampling=None,
+                         block_bytes=ASSIGN_BLOCK_BYTES):
+    rows = len(i_mat)
+    if oversampling is None:
+       oversampling = 2 * k
+
+    index = [int(rng.integers(rows))]
+    sq_dist = compute_closest_centroids(i_mat, i_mat[index])[1]
+    for r in range(0, rounds):
+        cost = np.sum(sq_dist)
+        if cost <= 0.0:
+           break
+        prob = oversampling * sq_dist / cost
+        picked = np.flatnonzero(rng.random(rows) < prob)
+        if len(picked) == 0:
+           continue
+        index.extend(picked.tolist())
+        labels, p_dist = compute_closest_centroids(i_mat, i_mat[picked],
+                                                   block_bytes)
+        sq_dist = np.minimum(sq_dist, p_dist)
+
+    # too few candidates, draw the centroids from all the samples
+    if len(index) <= k:
+       return seed_k_mean_plus_plus(i_mat, k, rng)
+
+    cand_mat = i_mat[np.array(index)]
+    labels, p_dist = compute_closest_centroids(i_mat, cand_mat, block_bytes)
+    weights = np.bincount(labels, minlength=len(cand_mat)).astype(np.float64)
+    return seed_k_mean_plus_plus(cand_mat, k, rng, weights)
 #------------------------------------------------------------------------------#
-def get_initial_cluster_centroids(i_mat, k, rows, cols):
-    # compute overall mean of the sample
-    om_vec = np.zeros(cols)
-    for r in range(0, rows):
-        om_vec = np.add(om_vec, i_mat[r])
-    om_vec = np.divide(om_vec, rows)
 
-    # compute euclidian distance of each sample from overall mean
-    uc_dict = {}
-    for r in range(0, rows):
-        dist = sci_dist.euclidean(i_mat[r], om_vec)
-        uc_dict[r] = dist
 
-    # sort samples based on euclidian distance of each sample from overall mean
-    uc_dict = OrderedDict(sorted(uc_dict.items(), key=lambda x: x[1]))
+#------------------------------------------------------------------------------#
+# compute initial cluster centroids, init is 'k-means++' or 'k-means||' and    #
+# seed seeds the random draws                                                  #
+#------------------------------------------------------------------------------#
+def get_initial_cluster_centroids(i_mat, k, init='k-means++', seed=None):
+    rng = np.random.default_rng(seed)
+    if init == 'k-means++':
+       c_mat = seed_k_mean_plus_plus(i_mat, k, rng)
+    elif init == 'k-means||':
+       c_mat = seed_k_mean_parallel(i_mat, k, rng)
+    else:
+       print("\nError: unknown k-mean seeding " + str(init) +
+             ". exiting gracefully.\n")
+       sys.exit()
+    return {j: c_mat[j] for j in range(0, k)}
+#------------------------------------------------------------------------------#
+
 
-    # get temporary sorted samples based on their euclidian distance of each
-    # sample from overall mean
-    t_i_mat = np.zeros(shape=(rows, cols))
-    r = 0
-    for key, val in uc_dict.items():
-        t_i_mat[r] = i_mat[key]
-        r += 1
+#------------------------------------------------------------------------------#
+# sum and count of the samples of every cluster                                #
+#------------------------------------------------------------------------------#
+def compute_centroid_sums(i_mat, labels, k):
+    sums = np.zeros((k, i_mat.shape[1]))
+    np.add.at(sums, labels, i_mat)
+    counts = np.bincount(labels, minlength=k)
+    return sums, counts
+#------------------------------------------------------------------------------#
 
-    # get initial centroids
-    centroids = {}
-    for i in range(1,k+1):
-        n_arr = np.zeros(cols)
-        c = 1 + (i-1) * int(rows / k)
-        n_arr = t_i_mat[c-1]
-        centroids[i-1] = n_arr
 
-    return centroids
+#------------------------------------------------------------------------------#
+# group the samples by cluster, keyed by the cluster keys                      #
+#------------------------------------------------------------------------------#
+def get_cluster_dict(labels, keys):
+    order = np.argsort(labels, kind='stable')
+    bounds = np.cumsum(np.bincount(labels, minlength=len(keys)))[:-1]
+    groups = np.split(order, bounds)
+    cluster = {}
+    for j in range(0, len(keys)):
+        cluster[int(keys[j])] = groups[j].tolist()
+    return cluster
 #------------------------------------------------------------------------------#
 
 
 #------------------------------------------------------------------------------#
 # classic Lloyd's k-mean clustering                                            #
+#                                                                              #
+# centroids are kept as the rows of a matrix c_mat, keys[j] is the key of the  #
+# cluster of row j and labels[r] the row of the centroid of sample r           #
 #------------------------------------------------------------------------------#
 class LloydKMC:
-      # find the absolute difference between new and old centroids 
-      def absolute_difference(self, new_centroids, old_centroids, cols):
-          if len(new_centroids) != len(old_centroids):
-             print("internal error")
-             sys.exit()
+      # data members
+      block_bytes = None
+      init = None
+      seed = None
+      max_iterations = None
+      n_distances = None
+      n_iterations = None
+
+      # init method, block_bytes bounds the memory of the distance matrix,
+      # init ('k-means++' or 'k-means||') and seed choose the initial
+      # centroids, and max_iterations, if given, stops the iterations before
+      # the centroids converge
+      def __init__(self, block_bytes=ASSIGN_BLOCK_BYTES, init='k-means++',
+                   seed=None, max_iterations=None):
+          self.block_bytes = block_bytes
+          self.init = init
+          self.seed = seed
+          self.max_iterations = max_iterations
+          self.n_distances = 0
+          self.n_iterations = 0
+
+      # update centroids to the means of their samples
+      def update_centroids(self, i_mat, labels, k):
+          sums, counts = compute_centroid_sums(i_mat, labels, k)
+          return sums / counts[:, None]
+
+      # remove empty clusters if any
+      def prune_cluster(self, labels, c_mat, keys):
+          counts = np.bincount(labels, minlength=len(keys))
+          keep = counts > 0
+          if np.all(keep):
+             return labels, c_mat, keys
+          remap = np.cumsum(keep) - 1
+          return remap[labels], c_mat[keep], keys[keep]
 
-          abs_d_mat = np.zeros(shape=(len(new_centroids), cols))
-
-          r = 0
-          for key, val_list in new_centroids.items():
-              if key not in old_centroids:
-                 print("internal error")
-                 sys.exit()
-              new_arr = new_centroids[key]
-              old_arr = old_centroids[key]
-              d_arr = np.subtract(old_arr, new_arr)
-              a_d_arr = np.absolute(d_arr)
-              abs_d_mat[r] = a_d_arr
-              r += 1
-
-          return abs_d_mat
-
-      # update centroids
-      def update_centroids(self, i_mat, k, rows, cols, cluster):
-          new_centroids = {}
-
-          for key, val_list in cluster.items():
-              sn = len(val_list)
-              n_arr = np.zeros(cols)
-              for index in val_list:
-                  n_arr = np.add(n_arr, i_mat[index])
-              new_centroids[key] = np.divide(n_arr, sn)
-
-          return new_centroids
-
-      # adjust k value and centroids array based on the result of pruning
-      def adjust(self, cluster, del_list, k, centroids):
-          if len(cluster) < k:
-             k = len(cluster)
-             for val in del_list:
-                 del centroids[val]
-          return k, centroids
-
-      # remove empty cluster if any
-      def prune_cluster(self, cluster):
-          del_list = []
-          for key, val_list in cluster.items():
-              if len(val_list) == 0:
-                 del_list.append(key)
-
-          for key in del_list:
-              del cluster[key]
-
-          return cluster, del_list
-
-      # assign samples to cluster
-      def assign_samples_to_clusters(self, i_mat, k, rows, cols, centroids):
-          # contruct empty cluster groups
-          cluster = {i: [] for i in range(k)}
-
-          # assign samples to clusters
-          for r in range(0, rows):
-              dist = float("inf")
-              cn = -1
-              for key, val_list in centroids.items():
-                  n_dist = sci_dist.euclidean(i_mat[r], val_list)
-                  if n_dist < dist:
-                     dist = n_dist
-                     cn = key
-              cluster[cn].append(r)
-
-          return cluster
+      # assign samples to the closest centroids
+      def assign_samples_to_clusters(self, i_mat, c_mat):
+          labels, sq_dist = compute_closest_centroids(i_mat, c_mat,
+                                                      self.block_bytes)
+          self.n_distances += len(i_mat) * len(c_mat)
+          return labels
 
       # iteratively update centroids till centroids get converges
-      def iterative_centroid_update(self, i_mat, k, rows, cols, centroids):
+      def iterative_centroid_update(self, i_mat, c_mat, keys):
           #iterate till centroid values converge
           while True:
+             self.n_iterations += 1
+
              # assign samples to clusters
-             cluster = self.assign_samples_to_clusters(
-                                                  i_mat, k, rows, cols, centroids)
+             labels = self.assign_samples_to_clusters(i_mat, c_mat)
 
              # prune cluster by eliminating if there exists any empty cluster
-             cluster, del_list = self.prune_cluster(cluster)
-
-             # adjust k value and centroids array based on the result of pruning
-             k, centroids = self.adjust(cluster, del_list, k, centroids)
+             labels, c_mat, keys = self.prune_cluster(labels, c_mat, keys)
 
              # update centroids
-             new_centroids = self.update_centroids(
-                                                  i_mat, k, rows, cols, cluster)
-
-             # compute the absolute difference between new centroids and old
-             # centroids
-             abs_d_mat = self.absolute_difference(
-                                                 new_centroids, centroids, cols)
+             new_c_mat = self.update_centroids(i_mat, labels, len(keys))
 
              # check if the centroids are converged, if so, stop the clustering
-             # process 
-             bool_mat = np.less(abs_d_mat, 0.00001)
-             if bool_mat.all() == True:
-                break;
+             # process
+             if np.all(np.absolute(new_c_mat - c_mat) < 0.00001) or \
+                self.n_iterations == self.max_iterations:
+                break
              else:
-                centroids = new_centroids
+                c_mat = new_c_mat
+
+          return labels, new_c_mat, keys
 
-          return cluster, new_centroids
+      # iterate from the given centroids instead of seeding them
+      def k_mean_cluster_from(self, i_mat, c_mat, keys):
+          return self.iterative_centroid_update(i_mat, c_mat, keys)
 
       # cluster data into k meangingful groups
       def k_mean_cluster(self, i_mat, k):
-          # get rows and cols
-          rows = len(i_mat)
-          cols = len(i_mat[0])
-
           # compute initial centroids of samples
-          centroids = get_initial_cluster_centroids(i_mat, k, rows, cols)
+          centroids = get_initial_cluster_centroids(i_mat, k, self.init,
+                                                    self.seed)
+          keys = np.array(list(centroids.keys()))
+          c_mat = np.array([centroids[key] for key in keys])
 
           # iteratively update centroids till centroids get converges 
-          cluster, final_centroids = self.iterative_centroid_update(
-                                            i_mat, k, rows, cols, centroids)
+          labels, c_mat, keys = self.k_mean_cluster_from(i_mat, c_mat, keys)
 
           # return final cluster
+          cluster = get_cluster_dict(labels, keys)
+          final_centroids = {int(keys[j]): c_mat[j] for j in range(len(keys))}
           return cluster, final_centroids
 #------------------------------------------------------------------------------#
 
 
+#------------------------------------------------------------------------------#
+# k-mean clustering with distance bounds                                       #
+#                                                                              #
+# base class of the Hamerly and Elkan engines. they run the very same Lloyd    #
+# iterations, but keep for every sample an upper bound on the distance to its  #
+# centroid and lower bounds on the distances to the other centroids. when the  #
+# centroids move, the bounds are loosened by the distances the centroids       #
+# moved, and a distance is only computed when the bounds cannot prove that     #
+# the sample stays where it is.                                                #
+#                                                                              #
+# bookkeeping the bounds costs passes over the data which a Lloyd assignment,  #
+# one matrix product, does not make. when the bounds rule out too few samples  #
+# an assignment computes all the distances, at the cost of a Lloyd one, and    #
+# an engine whose bookkeeping grows beyond that, see lloyd_is_cheaper, has the #
+# rest of the run fall back to the Lloyd assignment. the result is the same    #
+# either way                                                                   #
+#------------------------------------------------------------------------------#
+class BoundedKMC(LloydKMC):
+      # data members
+      labels = None
+      upper = None
+      lower = None
+      c_prev = None
+      x_sq = None
+      c_sq = None
+      c_m2 = None
+      n_bounded = None
+      use_lloyd = None
+
+      # distances each centroid moved since the last assignment
+      def get_centroid_shift(self, c_mat):
+          return dk.compute_paired_distances(c_mat, self.c_prev)
+
+      # half the distance of every centroid to every other centroid, and to
+      # its closest other centroid
+      def get_centroid_separation(self, c_mat):
+          cc_mat = dk.compute_pairwise_distances(c_mat, c_mat)
+          cc_mat *= 0.5
+          np.fill_diagonal(cc_mat, np.inf)
+          return np.min(cc_mat, axis=1), cc_mat
+
+      # number of samples per block of the bounds of samples to centroids
+      def get_block_rows(self, k):
+          return max(1, self.block_bytes // (8 * k))
+
+      # squared distances of the samples in index, a slice or an index array,
+      # to all the centroids, but for the squared norm of the samples. this
+      # is the very product of compute_closest_centroids, the centroids being
+      # scaled by -2 beforehand, which is exact
+      def compute_row_scores(self, i_mat, index):
+          d_mat = np.dot(i_mat[index], self.c_m2.T)
+          d_mat += self.c_sq
+          return d_mat
+
+      # distances of the samples in index to all the centroids
+      def compute_row_distances(self, i_mat, index):
+          d_mat = self.compute_row_scores(i_mat, index)
+          d_mat += self.x_sq[index, None]
+          np.maximum(d_mat, 0.0, out=d_mat)
+          return np.sqrt(d_mat, out=d_mat)
+
+      # closest centroid of the samples in index, its distance and the
+      # distance of the second closest one, only those two are square rooted
+      def compute_closest_two(self, i_mat, index):
+          d_mat = self.compute_row_scores(i_mat, index)
+          rows = np.arange(len(d_mat))
+          labels = np.argmin(d_mat, axis=1)
+          upper = d_mat[rows, labels] + self.x_sq[index]
+          d_mat[rows, labels] = np.inf
+          second = np.min(d_mat, axis=1) + self.x_sq[index]
+          return labels, np.sqrt(np.maximum(upper, 0.0)), \
+                 np.sqrt(np.maximum(second, 0.0))
+
+      # distances of the samples in index to the centroids in cols, one each
+      def compute_pair_distances(self, i_mat, c_mat, index, cols):
+          sq = np.einsum('ij,ij->i', i_mat[index], c_mat[cols])
+          sq *= -2.0
+          sq += self.c_sq[cols]
+          sq += self.x_sq[index]
+          return np.sqrt(np.maximum(sq, 0.0))
+
+      # distances of the samples in index to the single centroid j
+      def compute_centroid_distances(self, i_mat, c_mat, index, j):
+          sq = np.dot(i_mat[index], c_mat[j])
+          sq *= -2.0
+          sq += self.c_sq[j]
+          sq += self.x_sq[index]
+          return np.sqrt(np.maximum(sq, 0.0))
+
+      # blocks of the samples in index, or of all the samples without index
+      def get_blocks(self, rows, k, index=None):
+          block = self.get_block_rows(k)
+          for s in range(0, rows if index is None else len(index), block):
+              if index is None:
+                 yield slice(s, min(rows, s + block))
+              else:
+                 yield index[s:s+block]
+
+      # keep the bounds in step with the pruned clusters
+      def prune_cluster(self, labels, c_mat, keys):
+          keep = np.bincount(labels, minlength=len(keys)) > 0
+          labels, c_mat, keys = LloydKMC.prune_cluster(self, labels, c_mat,
+                                                       keys)
+          self.labels = labels
+          self.c_prev = c_mat
+          if not np.all(keep) and self.lower is not None:
+             self.prune_bounds(keep)
+          return labels, c_mat, keys
+
+      # drop the bounds of the pruned centroids
+      def prune_bounds(self, keep):
+          pass
+
+      # first assignment, every distance is computed
+      def assign_all(self, i_mat, c_mat):
+          raise NotImplementedError
+
+      # later assignments, only distances the bounds cannot rule out. returns
+      # the number of samples the bounds did not rule out
+      def assign_bounded(self, i_mat, c_mat):
+          raise NotImplementedError
+
+      # whether the Lloyd assignment is expected to be cheaper for the rest
+      # of the run, given the samples the last bounded assignment left open
+      def lloyd_is_cheaper(self, open_rows, rows):
+          return False
+
+      def assign_samples_to_clusters(self, i_mat, c_mat):
+          if self.use_lloyd:
+             return LloydKMC.assign_samples_to_clusters(self, i_mat, c_mat)
+
+          self.c_sq = np.einsum('ij,ij->i', c_mat, c_mat)
+          self.c_m2 = -2.0 * c_mat
+          if self.c_prev is None:
+             self.x_sq = np.einsum('ij,ij->i', i_mat, i_mat)
+             self.assign_all(i_mat, c_mat)
+          else:
+             open_rows = self.assign_bounded(i_mat, c_mat)
+             self.n_bounded += 1
+             self.use_lloyd = self.lloyd_is_cheaper(open_rows, len(i_mat))
+          self.c_prev = c_mat
+          return self.labels.copy()
+
+      # iterate from the given centroids, starting with fresh bounds
+      def k_mean_cluster_from(self, i_mat, c_mat, keys):
+          self.labels = None
+          self.upper = None
+          self.lower = None
+          self.c_prev = None
+          self.x_sq = None
+          self.n_bounded = 0
+          self.use_lloyd = False
+          return LloydKMC.k_mean_cluster_from(self, i_mat, c_mat, keys)
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# Hamerly's k-mean clustering                                                  #
+#                                                                              #
+# one lower bound per sample, on the distance to its second closest centroid.  #
+# a sample whose upper bound is below both its lower bound and half the        #
+# distance of its centroid to the closest other centroid keeps its cluster     #
+#------------------------------------------------------------------------------#
+class HamerlyKMC(BoundedKMC):
+      # exact distances to all centroids for the samples in index, or for all
+      # the samples without index
+      def assign_rows(self, i_mat, c_mat, index=None):
+          for b_index in self.get_blocks(len(i_mat), len(c_mat), index):
+              self.labels[b_index], self.upper[b_index], \
+              self.lower[b_index] = self.compute_closest_two(i_mat, b_index)
+          rows = len(i_mat) if index is None else len(index)
+          self.n_distances += rows * len(c_mat)
+
+      def assign_all(self, i_mat, c_mat):
+          rows = len(i_mat)
+          self.labels = np.empty(rows, dtype=np.int64)
+          self.upper = np.empty(rows)
+          self.lower = np.empty(rows)
+          self.assign_rows(i_mat, c_mat)
+
+      def assign_bounded(self, i_mat, c_mat):
+          # loosen the bounds, the lower bound by the largest move of any
+          # other centroid
+          shift = self.get_centroid_shift(c_mat)
+          self.upper += shift[self.labels]
+          order = np.argsort(shift)[::-1]
+          other_shift = np.full(len(c_mat), shift[order[0]])
+          if len(c_mat) > 1:
+             other_shift[order[0]] = shift[order[1]]
+          self.lower -= other_shift[self.labels]
+
+          # samples the bounds cannot keep in their cluster get a tight upper
+          # bound first, and all their distances only if that does not help.
+          # when more than half the samples need them anyway, all the
+          # samples get them, in one matrix product per block
+          half_sep = self.get_centroid_separation(c_mat)[0]
+          bound = np.maximum(half_sep[self.labels], self.lower)
+          index = np.flatnonzero(self.upper >= bound)
+          if 2 * len(index) > len(i_mat):
+             self.assign_rows(i_mat, c_mat)
+             return len(index)
+          self.upper[index] = self.compute_pair_distances(i_mat, c_mat, index,
+                                                          self.labels[index])
+          self.n_distances += len(index)
+          open_rows = len(index)
+          index = index[self.upper[index] >= bound[index]]
+          self.assign_rows(i_mat, c_mat, index)
+          return open_rows
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# Elkan's k-mean clustering                                                    #
+#                                                                              #
+# one lower bound per sample and centroid. the distance to a centroid is only  #
+# computed when the upper bound of the sample exceeds both its lower bound for #
+# that centroid and half the distance between that centroid and the centroid   #
+# of the sample.                                                               #
+#                                                                              #
+# the n x k lower bounds are never loosened as a whole: drift keeps the total  #
+# distance every centroid moved, bounds are stored with the drift of their     #
+# centroid added when they were computed, and the bound is the stored value    #
+# minus the current drift. a Hamerly bound on the closest of them first rules  #
+# out samples without reading their row of bounds at all. rows written by an   #
+# assignment of all the distances, which keeps only the Hamerly bound, are     #
+# stale, and recomputed as a whole when their sample is next examined          #
+#------------------------------------------------------------------------------#
+class ElkanKMC(BoundedKMC):
+      # data members
+      drift = None
+      lower_min = None
+      stale = None
+
+      def prune_bounds(self, keep):
+          self.lower = self.lower[:, keep]
+          self.drift = self.drift[keep]
+
+      # every open sample costs a few passes over its row of k bounds, more
+      # than its row of the Lloyd product once many samples stay open after
+      # the first, unsettled, iterations
+      def lloyd_is_cheaper(self, open_rows, rows):
+          return self.n_bounded > LLOYD_WARMUP and \
+                 open_rows > LLOYD_FRACTION * rows
+
+      # exact distances to all centroids for all the samples, the rows of
+      # bounds are left stale
+      def assign_rows(self, i_mat, c_mat):
+          for b_index in self.get_blocks(len(i_mat), len(c_mat)):
+              self.labels[b_index], self.upper[b_index], \
+              self.lower_min[b_index] = self.compute_closest_two(i_mat,
+                                                                 b_index)
+          self.stale[:] = True
+          self.n_distances += len(i_mat) * len(c_mat)
+
+      def assign_all(self, i_mat, c_mat):
+          rows = len(i_mat)
+          k = len(c_mat)
+          self.labels = np.empty(rows, dtype=np.int64)
+          self.upper = np.empty(rows)
+          self.lower = np.empty((rows, k))
+          self.lower_min = np.empty(rows)
+          self.stale = np.empty(rows, dtype=bool)
+          self.drift = np.zeros(k)
+          self.assign_rows(i_mat, c_mat)
+
+      # assign the samples in index, which all get a tight upper bound
+      def assign_block(self, i_mat, c_mat, index, half_cc):
+          k = len(c_mat)
+          labels = self.labels[index]
+          upper = self.compute_pair_distances(i_mat, c_mat, index, labels)
+          self.n_distances += len(index)
+
+          # (sample, centroid) pairs the bounds cannot rule out
+          lower = self.lower[index]
+          lower -= self.drift
+          rows = np.arange(len(index))
+          lower[rows, labels] = upper
+          mask = upper[:, None] >= lower
+          mask &= upper[:, None] >= half_cc[labels]
+          open_count = np.count_nonzero(mask, axis=1)
+
+          # stale samples, and those with many open pairs, get all their
+          # distances at once
+          dense = np.flatnonzero(self.stale[index] |
+                                 (open_count > k * DENSE_FRACTION))
+          if len(dense) > 0:
+             lower[dense] = self.compute_row_distances(i_mat, index[dense])
+             mask[dense] = False
+             self.stale[index[dense]] = False
+             self.n_distances += len(dense) * k
+
+          # the others the distances of their open pairs, one matrix product
+          # per centroid
+          mask_t = np.ascontiguousarray(mask.T)
+          for j in np.flatnonzero(np.any(mask_t, axis=1)):
+              r = np.flatnonzero(mask_t[j])
+              lower[r, j] = self.compute_centroid_distances(i_mat, c_mat,
+                                                            index[r], j)
+              self.n_distances += len(r)
+
+          # every sample moves to its closest centroid, on tight bounds only,
+          # which are stored back with the drift of their centroid
+          tight = mask
+          tight[dense] = True
+          tight[rows, labels] = True
+          b_lower = np.where(tight, lower, np.inf)
+          b_labels = np.argmin(b_lower, axis=1)
+          self.labels[index] = b_labels
+          self.upper[index] = b_lower[rows, b_labels]
+          lower[rows, b_labels] = np.inf
+          self.lower_min[index] = np.min(lower, axis=1)
+          lower[rows, b_labels] = self.upper[index]
+          lower += self.drift
+          np.copyto(lower, self.lower[index], where=~tight)
+          self.lower[index] = lower
+
+      def assign_bounded(self, i_mat, c_mat):
+          # loosen the upper bounds, the lower bounds through the drift, and
+          # their minimum by the largest move of any centroid
+          shift = self.get_centroid_shift(c_mat)
+          self.upper += shift[self.labels]
+          self.drift += shift
+          self.lower_min -= np.max(shift)
+
+          # only samples not ruled out by the separation of their centroid or
+          # by their closest lower bound, all the samples when more than half
+          # are not
+          half_sep, half_cc = self.get_centroid_separation(c_mat)
+          bound = np.maximum(half_sep[self.labels], self.lower_min)
+          index = np.flatnonzero(self.upper >= bound)
+          if 2 * len(index) > len(i_mat):
+             self.assign_rows(i_mat, c_mat)
+             return len(index)
+          for b_index in self.get_blocks(len(i_mat), len(c_mat), index):
+              self.assign_block(i_mat, c_mat, b_index, half_cc)
+          return len(index)
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# running mean and standard deviation of the columns of a stream of batches.   #
+# batches are merged with Chan's update, and the standard deviation is the     #
+# sample standard deviation, like util.standard_deviation                      #
+#------------------------------------------------------------------------------#
+class RunningMoments:
+      # data members
+      rows = None
+      mean = None
+      m2 = None
+
+      # init method
+      def __init__(self):
+          self.rows = 0
+
+      # merge the rows of a batch into the moments
+      def update(self, x_mat):
+          n = len(x_mat)
+          if n == 0:
+             return self
+          b_mean = np.mean(x_mat, axis=0)
+          b_m2 = np.sum(np.square(x_mat - b_mean), axis=0)
+          if self.rows == 0:
+             self.mean = b_mean
+             self.m2 = b_m2
+          else:
+             total = self.rows + n
+             delta = b_mean - self.mean
+             self.mean = self.mean + delta * (n / total)
+             self.m2 = self.m2 + b_m2 + np.square(delta) * (self.rows * n /
+                                                            total)
+          self.rows += n
+          return self
+
+      def get_mean(self):
+          return self.mean
+
+      # constant columns, or a single row, get a deviation of 1
+      def get_std(self):
+          if self.rows < 2:
+             return np.ones(len(self.mean))
+          sd = np.sqrt(self.m2 / (self.rows - 1))
+          sd[sd == 0.0] = 1.0
+          return sd
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# mini-batch k-mean clustering                                                 #
+#                                                                              #
+# centroids are updated one batch at a time with partial_fit, so the data set  #
+# never has to be in memory as a whole, and new batches keep the centroids     #
+# current without refitting. every centroid has its own learning rate, the     #
+# number of samples of the batch assigned to it over all the samples it was    #
+# ever assigned, so each centroid is the mean of the samples it has seen.      #
+#                                                                              #
+# samples are compared after dividing by scale, the column standard deviations #
+# of the data seen so far, while centroids are kept in the units of the data.  #
+# the mean cancels out of the differences, so this is k-mean clustering of     #
+# standardized data whose scale may still change from batch to batch           #
+#------------------------------------------------------------------------------#
+class MiniBatchKMC:
+      # data members
+      k = None
+      block_bytes = None
+      init = None
+      seed = None
+      c_mat = None
+      counts = None
+
+      # init method
+      def __init__(self, k, block_bytes=ASSIGN_BLOCK_BYTES, init='k-means++',
+                   seed=None):
+          self.k = k
+          self.block_bytes = block_bytes
+          self.init = init
+          self.seed = seed
+
+      # the first batch seeds the centroids
+      def init_centroids(self, x_mat, scale):
+          if len(x_mat) < self.k:
+             print("\nError: the first batch has fewer than " + str(self.k) +
+                   " samples. exiting gracefully.\n")
+             sys.exit()
+          centroids = get_initial_cluster_centroids(x_mat / scale, self.k,
+                                                    self.init, self.seed)
+          self.c_mat = np.array([centroids[j] for j in range(0, self.k)])
+          self.c_mat *= scale
+          self.counts = np.zeros(self.k, dtype=np.int64)
+
+      # closest centroid of every sample of the batch
+      def predict(self, batch, scale=None):
+          x_mat = np.asarray(batch, dtype=np.float64)
+          if scale is None:
+             scale = np.ones(x_mat.shape[1])
+          labels, sq_dist = compute_closest_centroids(x_mat / scale,
+                                                      self.c_mat / scale,
+                                                      self.block_bytes)
+          return labels
+
+      # move the centroids towards the samples of the batch assigned to them
+      def partial_fit(self, batch, scale=None):
+          x_mat = np.asarray(batch, dtype=np.float64)
+          if len(x_mat) == 0:
+             return self
+          if scale is None:
+             scale = np.ones(x_mat.shape[1])
+          if self.c_mat is None:
+             self.init_centroids(x_mat, scale)
+
+          labels = self.predict(x_mat, scale)
+          sums, n = compute_centroid_sums(x_mat, labels, self.k)
+          total = self.counts + n
+          hit = n > 0
+          rate = n[hit] / total[hit]
+          b_mean = sums[hit] / n[hit][:, None]
+          self.c_mat[hit] += rate[:, None] * (b_mean - self.c_mat[hit])
+          self.counts = total
+          return self
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# rows of a memory-mapped matrix read at once by out-of-core k-mean clustering #
+# and the number of rows sampled to seed its centroids                         #
+#------------------------------------------------------------------------------#
+OOC_CHUNK_ROWS = 1 << 16
+OOC_SAMPLE_ROWS = 1 << 16
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# out-of-core k-mean clustering                                                #
+#                                                                              #
+# clusters a matrix which is memory-mapped from a file, like the matrices      #
+# returned by FileHandler.map_matrix_file, without ever loading it. the mean   #
+# and standard deviation of the columns come from one streaming pass, the      #
+# initial centroids are seeded on a random sample of rows, and every Lloyd     #
+# iteration reads the file in chunks of chunk_rows rows, standardizing each    #
+# chunk on the fly. memory stays in the size of a chunk, whatever the size of  #
+# the file                                                                     #
+#------------------------------------------------------------------------------#
+class OutOfCoreKMC:
+      # data members
+      chunk_rows = None
+      sample_rows = None
+      block_bytes = None
+      init = None
+      seed = None
+      mean = None
+      std = None
+      n_iterations = None
+
+      # init method
+      def __init__(self, chunk_rows=OOC_CHUNK_ROWS, sample_rows=OOC_SAMPLE_ROWS,
+                   block_bytes=ASSIGN_BLOCK_BYTES, init='k-means++',
+                   seed=None):
+          self.chunk_rows = chunk_rows
+          self.sample_rows = sample_rows
+          self.block_bytes = block_bytes
+          self.init = init
+          self.seed = seed
+          self.n_iterations = 0
+
+      # first row and standardized rows of every chunk of the matrix, the
+      # chunk is copied as a float64 map would otherwise be written to
+      def iterate_chunks(self, x_map):
+          for s in range(0, len(x_map), self.chunk_rows):
+              x_mat = np.array(x_map[s:s+self.chunk_rows], dtype=np.float64,
+                               copy=True)
+              x_mat -= self.mean
+              x_mat /= self.std
+              yield s, x_mat
+
+      # column mean and standard deviation, in one pass over the matrix
+      def fit_moments(self, x_map):
+          moments = RunningMoments()
+          for s in range(0, len(x_map), self.chunk_rows):
+              moments.update(np.asarray(x_map[s:s+self.chunk_rows],
+                                        dtype=np.float64))
+          self.mean = moments.get_mean()
+          self.std = moments.get_std()
+
+      # seed the centroids on a sorted random sample of rows, so that the
+      # sample is read in file order
+      def get_initial_centroids(self, x_map, k):
+          rng = np.random.default_rng(self.seed)
+          rows = len(x_map)
+          if rows > self.sample_rows:
+             index = np.sort(rng.choice(rows, self.sample_rows, replace=False))
+          else:
+             index = np.arange(rows)
+          s_mat = np.asarray(x_map[index], dtype=np.float64)
+          s_mat = (s_mat - self.mean) / self.std
+          centroids = get_initial_cluster_centroids(s_mat, k, self.init, rng)
+          keys = np.array(list(centroids.keys()))
+          c_mat = np.array([centroids[key] for key in keys])
+          return c_mat, keys
+
+      # sums and counts of the samples closest to every centroid, chunk by
+      # chunk
+      def accumulate_centroid_sums(self, x_map, c_mat):
+          k = len(c_mat)
+          sums = np.zeros(c_mat.shape)
+          counts = np.zeros(k, dtype=np.int64)
+          for s, x_mat in self.iterate_chunks(x_map):
+              labels, sq_dist = compute_closest_centroids(x_mat, c_mat,
+                                                          self.block_bytes)
+              b_sums, b_counts = compute_centroid_sums(x_mat, labels, k)
+              sums += b_sums
+              counts += b_counts
+          return sums, counts
+
+      # cluster the rows of the matrix into k meangingful groups, the final
+      # centroids are standardized
+      def k_mean_cluster(self, x_map, k):
+          self.fit_moments(x_map)
+          c_mat, keys = self.get_initial_centroids(x_map, k)
+
+          #iterate till centroid values converge
+          while True:
+             self.n_iterations += 1
+             sums, counts = self.accumulate_centroid_sums(x_map, c_mat)
+
+             # prune cluster by eliminating if there exists any empty cluster
+             keep = counts > 0
+             c_mat = c_mat[keep]
+             keys = keys[keep]
+
+             # update centroids
+             new_c_mat = sums[keep] / counts[keep][:, None]
+
+             # check if the centroids are converged
+             if np.all(np.absolute(new_c_mat - c_mat) < 0.00001):
+                break
+             else:
+                c_mat = new_c_mat
+
+          return {int(keys[j]): new_c_mat[j] for j in range(len(keys))}
+
+      # key of the closest centroid of every row of the matrix, written to
+      # the .npy file labels_file if given, along with the sum squared error
+      # of the clusters
+      def assign_rows(self, x_map, c_mat, keys, labels_file=None):
+          rows = len(x_map)
+          if labels_file != None:
+             labels = np.lib.format.open_memmap(labels_file, mode='w+',
+                                                dtype=np.int64, shape=(rows,))
+          else:
+             labels = np.empty(rows, dtype=np.int64)
+
+          sse = 0.0
+          for s, x_mat in self.iterate_chunks(x_map):
+              b_labels, sq_dist = compute_closest_centroids(x_mat, c_mat,
+                                                            self.block_bytes)
+              labels[s:s+len(x_mat)] = keys[b_labels]
+              sse += np.sum(np.sqrt(sq_dist))
+          return labels, sse
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# k-mean clustering engines, all of them find the same clusters                #
+#------------------------------------------------------------------------------#
+KMC_ENGINES = {'lloyd': LloydKMC, 'hamerly': HamerlyKMC, 'elkan': ElkanKMC}
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# one k-mean clustering run from its own seed, along with the sum squared      #
+# error of the clusters and the seconds the run took                           #
+#------------------------------------------------------------------------------#
+def run_k_mean_restart(i_mat, engine, k, init, seed):
+    start = time.time()
+    kmc = KMC_ENGINES[engine](init=init, seed=seed)
+    cluster, final_centroids = kmc.k_mean_cluster(i_mat, k)
+    sse = util.compute_sum_squared_error(i_mat, cluster, final_centroids)
+    return cluster, final_centroids, sse, time.time() - start
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# input matrix of the restarts, set once in every worker process               #
+#------------------------------------------------------------------------------#
+worker_i_mat = None
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# initialize a worker process of the restart pool, the input matrix is mapped  #
+# read only from the file written by the parent, so that all the workers       #
+# share the pages of a single copy                                             #
+#------------------------------------------------------------------------------#
+def init_worker(i_mat_file):
+    global worker_i_mat
+    worker_i_mat = np.load(i_mat_file, mmap_mode='r')
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# call func on the input matrix of the worker process                          #
+#------------------------------------------------------------------------------#
+def run_in_worker(func, *args):
+    return func(worker_i_mat, *args)
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# mean silhouette of the samples in index (sorted) of i_mat, labels[i] is the  #
+# cluster of sample index[i]. samples alone in their cluster score 0           #
+#------------------------------------------------------------------------------#
+def compute_sampled_silhouette(i_mat, index, labels):
+    s_mat = np.asarray(i_mat[index], dtype=np.float64)
+    d_mat = dk.compute_pairwise_distances(s_mat, s_mat)
+    np.fill_diagonal(d_mat, 0.0)
+
+    # mean distance of every sample to the samples of every cluster
+    k = int(np.max(labels)) + 1
+    counts = np.bincount(labels, minlength=k).astype(np.float64)
+    member = np.zeros((len(labels), k))
+    member[np.arange(len(labels)), labels] = 1.0
+    sums = np.dot(d_mat, member)
+
+    rows = np.arange(len(labels))
+    own = counts[labels] - 1.0
+    a = sums[rows, labels] / np.maximum(own, 1.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+         mean_dist = sums / counts
+    mean_dist[:, counts == 0] = np.inf
+    mean_dist[rows, labels] = np.inf
+    b = np.min(mean_dist, axis=1)
+
+    score = np.zeros(len(labels))
+    valid = (own > 0) & np.isfinite(b)
+    score[valid] = (b[valid] - a[valid]) / np.maximum(a[valid], b[valid])
+    return float(np.mean(score))
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# warm start for k + 1 clusters: the cluster of largest sum of squared         #
+# distances is split in two by 2-mean clustering of its samples                #
+#------------------------------------------------------------------------------#
+def split_largest_cluster(i_mat, labels, c_mat, rng):
+    d_mat = i_mat - c_mat[labels]
+    sq_dist = np.einsum('ij,ij->i', d_mat, d_mat)
+    cluster_sse = np.bincount(labels, weights=sq_dist, minlength=len(c_mat))
+    j = int(np.argmax(cluster_sse))
+    members = i_mat[labels == j]
+
+    halves = seed_k_mean_plus_plus(members, min(2, len(members)), rng)
+    m_labels, halves, keys = LloydKMC().k_mean_cluster_from(
+                                   members, halves, np.arange(len(halves)))
+    # a cluster of identical samples cannot be split, add any sample
+    if len(halves) < 2:
+       halves = np.vstack([halves, i_mat[rng.integers(len(i_mat))]])
+    return np.vstack([np.delete(c_mat, j, axis=0), halves])
+#------------------------------------------------------------------------------#
+
+
 #------------------------------------------------------------------------------#
 # Class KMeanCluster: which implements k-mean clustering                       #
 #------------------------------------------------------------------------------#
 class KMeanCluster:
-      # cluster data into k meangingful groups
+      # data members
+      engine = None
+      k = None
+      init = None
+      seed = None
+      n_init = None
+      n_jobs = None
+      restarts = None
+      mini_batch = None
+      moments = None
+
+      # init method, engine is 'lloyd', 'hamerly' or 'elkan', init is
+      # 'k-means++' or 'k-means||' (for large data sets) and seed seeds the
+      # initial centroids. n_init independent restarts are run across n_jobs
+      # worker processes (-1 for all cores), keeping the one of lowest sum
+      # squared error
+      def __init__(self, engine='lloyd', k=10, init='k-means++', seed=None,
+                   n_init=1, n_jobs=1):
+          self.engine = engine
+          self.k = k
+          self.init = init
+          self.seed = seed
+          self.n_init = n_init
+          self.n_jobs = n_jobs
+
+      # hyperparameters which change the clusters, all engines find the same
+      def get_params(self):
+          return {'k': self.k, 'init': self.init, 'seed': self.seed,
+                  'n_init': self.n_init}
+
+      # derive an independent seed for every restart from the seed, so that
+      # the restarts do not depend on the number of workers
+      def get_restart_seeds(self):
+          seed = self.seed
+          if seed == None:
+             seed = random.getrandbits(64)
+          seeds = np.random.SeedSequence(seed).generate_state(self.n_init)
+          return [int(s) for s in seeds]
+
+      # number of worker processes to use
+      def get_n_jobs(self):
+          if self.n_jobs == None or self.n_jobs < 1:
+             return os.cpu_count()
+          return self.n_jobs
+
+      # call func(i_mat, *a) for the arguments a taken in turn from the
+      # argument lists, one call after another, or across a pool of worker
+      # processes which map the input matrix from a file, results are in the
+      # order of the arguments
+      def map_over_workers(self, i_mat, func, *args):
+          n = len(args[0])
+          n_jobs = min(self.get_n_jobs(), n)
+          if n_jobs == 1:
+             return [func(i_mat, *a) for a in zip(*args)]
+
+          with tempfile.TemporaryDirectory() as tmp_dir:
+             i_mat_file = util.share_array(np.ascontiguousarray(i_mat),
+                                    os.path.join(tmp_dir, 'i_mat.npy'))
+             with ProcessPoolExecutor(max_workers=n_jobs,
+                                      initializer=init_worker,
+                                      initargs=(i_mat_file,)) as pool:
+                return list(pool.map(run_in_worker, [func] * n, *args))
+
+      # run the restarts one after another, or across the worker processes
+      def run_restarts(self, i_mat, k, seeds):
+          n = len(seeds)
+          return self.map_over_workers(i_mat, run_k_mean_restart,
+                                       [self.engine] * n, [k] * n,
+                                       [self.init] * n, seeds)
+
+      # cluster data into k meangingful groups, with several restarts the
+      # seed, sum squared error and seconds of every restart are kept in
+      # restarts
       def k_mean_cluster(self, i_mat, k):
-          kmc = LloydKMC()
-          cluster, final_centroids = kmc.k_mean_cluster(i_mat, k)
+          if self.n_init == 1:
+             kmc = KMC_ENGINES[self.engine](init=self.init, seed=self.seed)
+             cluster, final_centroids = kmc.k_mean_cluster(i_mat, k)
+             return cluster, final_centroids
+
+          seeds = self.get_restart_seeds()
+          results = self.run_restarts(i_mat, k, seeds)
+          self.restarts = [(seeds[r], results[r][2], results[r][3])
+                           for r in range(0, len(seeds))]
+          best = int(np.argmin([result[2] for result in results]))
+          cluster, final_centroids, sse, seconds = results[best]
           return cluster, final_centroids
 
       # normalize input matrix
       def normalize_input_matrix(self, i_mat):
           return util.standardization(i_mat, False)
 
+      # construct input matrix from data, without normalizing it
+      def construct_raw_matrix(self, data):
+          return np.array([line[1:] for line in data], dtype=np.float64)
+
       # construct input matrix from data
       def construct_input_matrix(self, data):
-          rows = len(data)
-          cols = len(data[0]) - 1
-          i_mat = np.zeros(shape=(rows, cols))
-
-          r = 0
-          for line in data:
-              c = 0
-              for ele in line[1:]:
-                  i_mat[r][c] = ele
-                  c += 1
-              r += 1
-          return self.normalize_input_matrix(i_mat)
+          return self.normalize_input_matrix(self.construct_raw_matrix(data))
+
+      # assign data to the given (like saved) centroids, without iterating
+      def cluster_with_centroids(self, data, centroids):
+          i_mat = self.construct_input_matrix(data)
+          keys = np.array(list(centroids.keys()))
+          c_mat = np.array([centroids[key] for key in keys])
+
+          kmc = LloydKMC()
+          labels = kmc.assign_samples_to_clusters(i_mat, c_mat)
+          labels, c_mat, keys = kmc.prune_cluster(labels, c_mat, keys)
+          return i_mat, get_cluster_dict(labels, keys), centroids
 
       # ask k-mean clusterer to cluster the data into k meaningful groups 
       def cluster(self, data):
@@ -230,8 +1124,91 @@ class KMeanCluster:
           i_mat = self.construct_input_matrix(data)
 
           # cluster data into k meangingful groups
-          k = 10
-          cluster, final_centroids = self.k_mean_cluster(i_mat, k)
+          cluster, final_centroids = self.k_mean_cluster(i_mat, self.k)
 
           return i_mat, cluster, final_centroids
+
+      # cluster the rows of a memory-mapped matrix, like one returned by
+      # FileHandler.map_matrix_file, out of core. the cluster of every row is
+      # written to the .npy file labels_file if given
+      def cluster_matrix_file(self, x_map, labels_file=None):
+          kmc = OutOfCoreKMC(init=self.init, seed=self.seed)
+          final_centroids = kmc.k_mean_cluster(x_map, self.k)
+          keys = np.array(list(final_centroids.keys()))
+          c_mat = np.array([final_centroids[key] for key in keys])
+          labels, sse = kmc.assign_rows(x_map, c_mat, keys, labels_file)
+          return labels, final_centroids, sse
+
+      # cluster the data for every k from k_min to k_max, k_max defaults to
+      # k. the data is read and standardized once, and every k starts from
+      # the clusters of k - 1 with its largest cluster split. the sum squared
+      # error and the seconds of every k are reported along with the mean
+      # silhouette of a sample of sample_size rows, computed across the
+      # worker processes
+      def sweep_k(self, data, k_min=2, k_max=None, sample_size=1000):
+          if k_max == None:
+             k_max = self.k
+          i_mat = self.construct_input_matrix(data)
+          rng = np.random.default_rng(self.seed)
+
+          report = []
+          solutions = {}
+          label_list = []
+          c_mat = None
+          for k in range(k_min, k_max + 1):
+              start = time.time()
+              if c_mat is None:
+                 centroids = get_initial_cluster_centroids(i_mat, k,
+                                                           self.init, rng)
+                 c_mat = np.array([centroids[j] for j in range(0, k)])
+              else:
+                 c_mat = split_largest_cluster(i_mat, labels, c_mat, rng)
+              kmc = KMC_ENGINES[self.engine]()
+              labels, c_mat, keys = kmc.k_mean_cluster_from(i_mat, c_mat,
+                                                   np.arange(len(c_mat)))
+
+              cluster = get_cluster_dict(labels, np.arange(len(c_mat)))
+              final_centroids = {j: c_mat[j] for j in range(0, len(c_mat))}
+              sse = util.compute_sum_squared_error(i_mat, cluster,
+                                                   final_centroids)
+              solutions[k] = (cluster, final_centroids)
+              label_list.append(labels)
+              report.append([k, len(c_mat), sse, None, time.time() - start])
+
+          # silhouettes of all the k on the same sample of rows
+          rows = len(i_mat)
+          index = np.sort(rng.choice(rows, min(rows, sample_size),
+                                     replace=False))
+          scores = self.map_over_workers(i_mat, compute_sampled_silhouette,
+                                         [index] * len(label_list),
+                                         [l[index] for l in label_list])
+          for r in range(0, len(report)):
+              report[r][3] = scores[r]
+          return i_mat, report, solutions
+
+      # update the mini-batch centroids with a batch of data, like a chunk
+      # read by FileHandler.read_training_data_chunks
+      def partial_fit(self, data):
+          if self.mini_batch is None:
+             self.mini_batch = MiniBatchKMC(self.k, init=self.init,
+                                            seed=self.seed)
+             self.moments = RunningMoments()
+          i_mat = self.construct_raw_matrix(data)
+          self.moments.update(i_mat)
+          self.mini_batch.partial_fit(i_mat, self.moments.get_std())
+          return self
+
+      # mini-batch centroids, standardized with the moments of all the batches
+      def get_mini_batch_centroids(self):
+          c_mat = self.mini_batch.c_mat - self.moments.get_mean()
+          c_mat /= self.moments.get_std()
+          return {j: c_mat[j] for j in range(0, len(c_mat))}
+
+      # cluster a batch of data on the mini-batch centroids, the batch is
+      # returned standardized like the centroids of get_mini_batch_centroids
+      def predict_batch(self, data):
+          i_mat = self.construct_raw_matrix(data)
+          labels = self.mini_batch.predict(i_mat, self.moments.get_std())
+          i_mat = (i_mat - self.moments.get_mean()) / self.moments.get_std()
+          return i_mat, get_cluster_dict(labels, np.arange(self.k))
 #------------------------------------------------------------------------------#
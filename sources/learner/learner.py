@@ -15,6 +15,8 @@
 #------------------------------------------------------------------------------#
 import os
 import sys
+import importlib
+import numpy as np
 #------------------------------------------------------------------------------#
 
 
@@ -22,12 +24,7 @@ import sys
 # import package modules here                                                  #
 #------------------------------------------------------------------------------#
 import sources.utility.util as util
-import sources.learner.linear_regression as lin
-import sources.learner.logistic_regression as log
-import sources.learner.k_mean_clustering as kmc
-import sources.learner.hierarchical_clustering as hrc
-import sources.learner.classification_tree as cla
-import sources.learner.random_forest as rf
+import sources.file_handler.model_store as ms
 #------------------------------------------------------------------------------#
 
 
@@ -35,30 +32,72 @@ import sources.learner.random_forest as rf
 # Learner Class                                                                #
 #------------------------------------------------------------------------------#
 class Learner:
+      # kinds of learner which stream their training data, they are given an
+      # iterable of chunks of chunk_rows rows instead of the whole data set
+      streamed_kinds = [1]
+      chunk_rows = 1 << 15
+
       # data members
       training_data = None
       test_data = None
       kind = None
+      d_file = None
+      model_store = None
 
-      # special init method
-      def __init__(self, training_data, test_data, kind):
+      # special init method, models learned from the training data file
+      # d_file are saved and loaded back instead of learning them again
+      def __init__(self, training_data, test_data, kind, d_file=None):
           self.training_data = training_data
           self.test_data = test_data
           self.kind = kind
+          self.d_file = d_file
+          self.model_store = ms.ModelStore()
+
+      # key of the model learned with the given hyperparameters, None when
+      # the training data file is not known
+      def get_model_key(self, params):
+          if self.d_file == None:
+             return None
+          return self.model_store.get_model_key(self.kind, params, self.d_file)
+
+      # load the saved arrays and meta data of a model, None if not saved yet
+      def load_model(self, key):
+          if key == None or not self.model_store.has_model(key):
+             return None
+          return self.model_store.load_model(key)
+
+      # save the arrays and meta data of a learned model
+      def save_model(self, key, arrays, meta):
+          if key != None:
+             self.model_store.save_model(key, arrays, meta)
 
       # random forest 
-      def __random_forest(self):
+      def __random_forest(self, rf):
          rfo = rf.RandomForest()
-         roots = rfo.learn(self.training_data)
+         key = self.get_model_key(rfo.get_params())
+         model = self.load_model(key)
+         if model != None:
+            roots = rfo.set_model_arrays(*model)
+         else:
+            roots = rfo.learn(self.training_data)
+            self.save_model(key, *rfo.get_model_arrays(roots))
          class_dict = rfo.classify(roots, self.test_data)
          correct_class_dict = util.get_correct_class_dict_for_random_forest()
          util.print_random_forest_output(self.test_data, roots, class_dict,
                                          correct_class_dict)
+         util.print_random_forest_oob_output(rfo.oob_accuracy,
+                                             rfo.oob_class_error)
 
       # classification tree
-      def __classification_tree(self):
+      def __classification_tree(self, cla):
          clo = cla.ClassificationTree()
-         root = clo.learn(self.training_data)
+         key = self.get_model_key(clo.get_params())
+         model = self.load_model(key)
+         if model != None:
+            root = clo.set_model_arrays(*model)
+         else:
+            root = clo.learn(self.training_data)
+            self.save_model(key, *clo.get_model_arrays(root))
          class_dict = clo.classify(root, self.test_data)
          correct_class_dict = \
                            util.get_correct_class_dict_for_classification_tree()
@@ -66,50 +105,90 @@ class Learner:
                                                correct_class_dict)
 
       # hierarchical clustering
-      def __hierarchical_clustering(self):
+      def __hierarchical_clustering(self, hrc):
          hro = hrc.HierarchicalCluster()
-         cluster_list = hro.cluster(self.training_data)
-         util.print_hierarchical_clustering_output(cluster_list)
+         hierarchy = hro.cluster(self.training_data)
+         util.print_hierarchical_clustering_output(hierarchy)
 
       # k-mean clustering
-      def __k_mean_clustering(self):
+      def __k_mean_clustering(self, kmc):
          kmo = kmc.KMeanCluster()
-         i_mat, cluster, final_centroids = kmo.cluster(self.training_data)
+         key = self.get_model_key(kmo.get_params())
+         model = self.load_model(key)
+         if model != None:
+            arrays, meta = model
+            centroids = dict(zip(meta['keys'], arrays['centroids']))
+            i_mat, cluster, final_centroids = \
+                       kmo.cluster_with_centroids(self.training_data, centroids)
+         else:
+            i_mat, cluster, final_centroids = kmo.cluster(self.training_data)
+            self.save_model(key, {'centroids':
+                                  np.array(list(final_centroids.values()))},
+                            {'keys': list(final_centroids.keys())})
          sse = util.compute_sum_squared_error(i_mat, cluster, final_centroids)
          util.print_k_mean_clustering_output(cluster, sse)
+         if kmo.restarts != None:
+            util.print_k_mean_restart_output(kmo.restarts)
+
+      # k-mean clustering for every k up to KMeanCluster.k
+      def __k_mean_sweep(self, kmc):
+         kmo = kmc.KMeanCluster()
+         i_mat, report, solutions = kmo.sweep_k(self.training_data)
+         util.print_k_sweep_output(report)
 
       # logistic regression learner
-      def __logistic_regression(self):
+      def __logistic_regression(self, log):
           lro = log.LogisticRegression()
-          r_vec = lro.learn(self.training_data)
+          key = self.get_model_key({})
+          model = self.load_model(key)
+          if model != None:
+             r_vec = model[0]['r_vec']
+          else:
+             r_vec = lro.learn(self.training_data)
+             self.save_model(key, {'r_vec': r_vec}, {})
           o_vec, p_vec = lro.predict(self.test_data, r_vec)
           error, accuracy = util.compute_error_and_accuracy(o_vec, p_vec)
           util.print_logistic_regression_output(o_vec, p_vec, error, accuracy)
 
       # linear regression learner
-      def __linear_regression(self):
+      def __linear_regression(self, lin):
           gro = lin.LinearRegression()
-          r_vec = gro.learn(self.training_data)
+          key = self.get_model_key(gro.get_params())
+          model = self.load_model(key)
+          if model != None:
+             r_vec = model[0]['r_vec']
+          else:
+             r_vec = gro.learn_chunks(self.training_data)
+             self.save_model(key, {'r_vec': r_vec}, {})
           o_vec, p_vec = gro.predict(self.test_data, r_vec)
           mse = util.compute_mean_squared_error(o_vec, p_vec)
           util.print_linear_regression_output(o_vec, p_vec, mse)
 
+      # learner registry, every kind of learner maps to the module which
+      # implements it and to the method which runs it, only the module of the
+      # selected learner is ever imported
+      registry = {
+         1: ('sources.learner.linear_regression', __linear_regression),
+         2: ('sources.learner.logistic_regression', __logistic_regression),
+         3: ('sources.learner.k_mean_clustering', __k_mean_clustering),
+         4: ('sources.learner.hierarchical_clustering',
+             __hierarchical_clustering),
+         5: ('sources.learner.classification_tree', __classification_tree),
+         6: ('sources.learner.random_forest', __random_forest),
+         7: ('sources.learner.k_mean_clustering', __k_mean_sweep),
+      }
+
       # public interface function of the class Learner
       def learn_and_predict(self):
+          if self.kind not in self.registry:
+             print("\nError: " + str(self.kind) + " is invalid entry for the " +
+                   "choice of learner. exiting gracefully.\n")
+             sys.exit()
+
           os.system("clear")
           print("\n\nBe patient... I am learning...")
 
-          # call learner based on user choice
-          if self.kind == 1:
-             self.__linear_regression()
-          elif self.kind == 2:
-             self.__logistic_regression()
-          elif self.kind == 3:
-             self.__k_mean_clustering()
-          elif self.kind == 4:
-             self.__hierarchical_clustering()
-          elif self.kind == 5:
-             self.__classification_tree()
-          elif self.kind == 6:
-             self.__random_forest()
+          # import the selected learner and call it
+          module_name, learner = self.registry[self.kind]
+          learner(self, importlib.import_module(module_name))
 #------------------------------------------------------------------------------#
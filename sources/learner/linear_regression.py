@@ -16,7 +16,6 @@
 #------------------------------------------------------------------------------#
 import sys
 import numpy as np
-import matplotlib.pyplot as plt
 #------------------------------------------------------------------------------#
 
 
@@ -27,6 +26,13 @@ import sources.utility.util as util
 #------------------------------------------------------------------------------#
 
 
+#------------------------------------------------------------------------------#
+# solvers of the least square problem                                          #
+#------------------------------------------------------------------------------#
+SOLVERS = ['cholesky', 'qr', 'lstsq']
+#------------------------------------------------------------------------------#
+
+
 
 #------------------------------------------------------------------------------#
 # LSLR Class: which implements the multi-variate least square linear           
@@ -65,16 +71,157 @@ import sources.utility.util as util
 #
 # where X^ is the transpose of X, and X^X is hessian matrix. More details can
 # be found in any machine learning book. 
+#
+# Equation (1) is never solved by inverting X^X. The solver 'cholesky'
+# factorizes X^X + rI, where r is the ridge term which is not applied to the
+# intercept b1, and solves the two triangular systems. The solvers 'qr' and
+# 'lstsq' work on X itself, which squares the condition number of X^X away,
+# for ill-conditioned data; the ridge term is then added as the extra rows
+# sqrt(r)I of X and zeros of Y. Whenever a factorization fails, rank-deficient
+# X for example, the minimum norm solution of 'lstsq' is returned instead.
 #------------------------------------------------------------------------------#
 class LSLR:
-      def least_square_linear_regression(self, phi_mat, t_vec):
-          # compute equation (1) above
-          phi_mat_t = np.matrix.transpose(phi_mat)
-          hessian_mat = np.dot(phi_mat_t, phi_mat)
-          hessian_mat_inv = np.linalg.inv(hessian_mat)
-          phi_t_t_vec = np.dot(phi_mat_t, t_vec)
-          r_vec = np.dot(hessian_mat_inv, phi_t_t_vec)
+      # data members
+      solver = None
+      ridge = None
+
+      # init method, solver is one of SOLVERS and ridge the ridge term
+      def __init__(self, solver='cholesky', ridge=0.0):
+          if solver not in SOLVERS:
+             print("\nError: unknown linear regression solver " + str(solver) +
+                   ". exiting gracefully.\n")
+             sys.exit()
+          self.solver = solver
+          self.ridge = ridge
+
+      # X^X as a single symmetric product, which NumPy hands to the BLAS
+      # routine syrk as both operands are views of the same matrix
+      def compute_hessian_matrix(self, phi_mat):
+          phi_mat = np.ascontiguousarray(phi_mat, dtype=np.float64)
+          return phi_mat.T @ phi_mat
+
+      # ridge term for every coefficient but the intercept
+      def get_ridge_vector(self, cols):
+          r_vec = np.full(cols, float(self.ridge))
+          r_vec[0] = 0.0
           return r_vec
+
+      # solve (X^X + rI)B = X^Y through the cholesky factor L of X^X + rI,
+      # LZ = X^Y and then L^B = Z. rounding can leave X^X of a rank-deficient
+      # X positive definite, with a pivot of L down at about sqrt(eps) of the
+      # largest, so such a factor is refused like R is in solve_qr
+      def solve_cholesky(self, hessian_mat, phi_t_t_vec):
+          hessian_mat = hessian_mat + np.diag(self.get_ridge_vector(
+                                                          len(hessian_mat)))
+          l_mat = np.linalg.cholesky(hessian_mat)
+          l_diag = np.diag(l_mat)
+          if np.any(l_diag <= np.sqrt(np.finfo(np.float64).eps *
+                                      len(hessian_mat)) * l_diag.max()):
+             raise np.linalg.LinAlgError("rank-deficient matrix")
+          z_vec = np.linalg.solve(l_mat, phi_t_t_vec)
+          return np.linalg.solve(l_mat.T, z_vec)
+
+      # X and Y with the rows of the ridge term appended
+      def get_ridge_system(self, phi_mat, t_vec):
+          r_vec = self.get_ridge_vector(phi_mat.shape[1])
+          if not np.any(r_vec):
+             return phi_mat, t_vec
+          phi_mat = np.vstack((phi_mat, np.diag(np.sqrt(r_vec))))
+          t_vec = np.concatenate((t_vec, np.zeros(len(r_vec))))
+          return phi_mat, t_vec
+
+      # solve XB = Y in the least square sense through X = QR, RB = Q^Y
+      def solve_qr(self, phi_mat, t_vec):
+          phi_mat, t_vec = self.get_ridge_system(phi_mat, t_vec)
+          q_mat, r_mat = np.linalg.qr(phi_mat)
+          if np.any(np.absolute(np.diag(r_mat)) <=
+                    np.finfo(np.float64).eps * np.absolute(r_mat).max() *
+                    max(phi_mat.shape)):
+             raise np.linalg.LinAlgError("rank-deficient matrix")
+          return np.linalg.solve(r_mat, np.dot(q_mat.T, t_vec))
+
+      # minimum norm least square solution of XB = Y
+      def solve_lstsq(self, phi_mat, t_vec):
+          phi_mat, t_vec = self.get_ridge_system(phi_mat, t_vec)
+          return np.linalg.lstsq(phi_mat, t_vec, rcond=None)[0]
+
+      def least_square_linear_regression(self, phi_mat, t_vec):
+          phi_mat = np.asarray(phi_mat, dtype=np.float64)
+          t_vec = np.asarray(t_vec, dtype=np.float64)
+          try:
+             if self.solver == 'cholesky':
+                # compute equation (1) above
+                hessian_mat = self.compute_hessian_matrix(phi_mat)
+                phi_t_t_vec = np.dot(phi_mat.T, t_vec)
+                return self.solve_cholesky(hessian_mat, phi_t_t_vec)
+             if self.solver == 'qr':
+                return self.solve_qr(phi_mat, t_vec)
+          except np.linalg.LinAlgError:
+             pass
+          return self.solve_lstsq(phi_mat, t_vec)
+
+      # solve equation (1) when only X^X and X^Y are known, like after
+      # streaming the data. 'qr' and 'lstsq' need X itself, so they solve
+      # (X^X + rI)B = X^Y in the least square sense, the minimum norm
+      # solution of which is still that of XB = Y when r is zero
+      def least_square_from_hessian(self, hessian_mat, phi_t_t_vec):
+          if self.solver == 'cholesky':
+             try:
+                return self.solve_cholesky(hessian_mat, phi_t_t_vec)
+             except np.linalg.LinAlgError:
+                pass
+          hessian_mat = hessian_mat + np.diag(self.get_ridge_vector(
+                                                          len(hessian_mat)))
+          return np.linalg.lstsq(hessian_mat, phi_t_t_vec, rcond=None)[0]
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# RunningCoMoments Class: means and co-moment matrix of the columns of the     #
+# rows seen so far, sum((x - mean)(x - mean)^), merged batch by batch with     #
+# Chan's update, so that rows of any count fit in O(d^2) memory without the    #
+# loss of precision of summing x x^ of uncentered rows                         #
+#------------------------------------------------------------------------------#
+class RunningCoMoments:
+      # data members
+      rows = None
+      mean = None
+      m2_mat = None
+
+      # init method
+      def __init__(self):
+          self.rows = 0
+
+      # merge the rows of a batch into the co-moments
+      def update(self, x_mat):
+          n = len(x_mat)
+          if n == 0:
+             return self
+          b_mean = np.mean(x_mat, axis=0)
+          x_mat = np.ascontiguousarray(x_mat - b_mean)
+          b_m2_mat = x_mat.T @ x_mat
+          if self.rows == 0:
+             self.mean = b_mean
+             self.m2_mat = b_m2_mat
+          else:
+             total = self.rows + n
+             delta = b_mean - self.mean
+             self.mean = self.mean + delta * (n / total)
+             self.m2_mat = self.m2_mat + b_m2_mat + \
+                           np.outer(delta, delta) * (self.rows * n / total)
+          self.rows += n
+          return self
+
+      def get_mean(self):
+          return self.mean
+
+      # constant columns, or a single row, get a deviation of 1
+      def get_std(self):
+          if self.rows < 2:
+             return np.ones(len(self.mean))
+          sd = np.sqrt(np.diag(self.m2_mat) / (self.rows - 1))
+          sd[sd == 0.0] = 1.0
+          return sd
 #------------------------------------------------------------------------------#
 
 
@@ -82,9 +229,23 @@ class LSLR:
 # LinearRegression Class                                                       #
 #------------------------------------------------------------------------------#
 class LinearRegression:
+      # data members
+      solver = None
+      ridge = None
+      moments = None
+
+      # init method, solver and ridge are those of LSLR
+      def __init__(self, solver='cholesky', ridge=0.0):
+          self.solver = solver
+          self.ridge = ridge
+
+      # hyperparameters which change the learned coefficients
+      def get_params(self):
+          return {'solver': self.solver, 'ridge': self.ridge}
+
       # compute regression coefficients 
       def compute_regression_coefficients(self, i_mat, o_vec):
-          lslr = LSLR()
+          lslr = LSLR(self.solver, self.ridge)
           return lslr.least_square_linear_regression(i_mat, o_vec)
 
       # construct output vector from data
@@ -150,4 +311,51 @@ class LinearRegression:
 
           # return regression coefficients
           return r_vec
+
+      # construct the matrix of the output and raw input columns of data
+      def construct_raw_matrix(self, data):
+          return np.array(data, dtype=np.float64)
+
+      # accumulate the co-moments of a batch of data, like a chunk read by
+      # FileHandler.read_training_data_chunks, the output being column 0
+      def partial_fit(self, data):
+          if self.moments is None:
+             self.moments = RunningCoMoments()
+          self.moments.update(self.construct_raw_matrix(data))
+          return self
+
+      # regression coefficients of all the batches given to partial_fit, the
+      # same as those of learn on the standardized input matrix. with S the
+      # co-moments, the standardized columns Z have a zero sum, so
+      #
+      #         Z^Z = S_xx / (sd sd^),  Z^Y = S_xy / sd,  1^Y = n mean_y
+      #
+      # and X^X of equation (1) is block diagonal in n and Z^Z
+      def get_streamed_coefficients(self):
+          if self.moments is None or self.moments.rows == 0:
+             print("\nError: no training data to learn linear regression " +
+                   "from. exiting gracefully.\n")
+             sys.exit()
+          rows = self.moments.rows
+          sd = self.moments.get_std()[1:]
+          m2_mat = self.moments.m2_mat
+          cols = len(m2_mat)
+
+          hessian_mat = np.zeros((cols, cols))
+          hessian_mat[0, 0] = rows
+          hessian_mat[1:, 1:] = m2_mat[1:, 1:] / np.outer(sd, sd)
+          phi_t_t_vec = np.empty(cols)
+          phi_t_t_vec[0] = rows * self.moments.get_mean()[0]
+          phi_t_t_vec[1:] = m2_mat[1:, 0] / sd
+
+          lslr = LSLR(self.solver, self.ridge)
+          return lslr.least_square_from_hessian(hessian_mat, phi_t_t_vec)
+
+      # learn from training data given as an iterable of chunks, in memory
+      # which grows with the square of the number of columns only
+      def learn_chunks(self, chunks):
+          self.moments = None
+          for chunk in chunks:
+              self.partial_fit(chunk)
+          return self.get_streamed_coefficients()
 #------------------------------------------------------------------------------#
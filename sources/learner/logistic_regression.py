@@ -17,7 +17,6 @@
 import sys
 import math
 import numpy as np
-import matplotlib.pyplot as plt
 #------------------------------------------------------------------------------#
 
 
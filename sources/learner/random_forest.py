@@ -17,12 +17,14 @@
 #------------------------------------------------------------------------------#
 # import built-in system modules here                                          #
 #------------------------------------------------------------------------------#
+import os
 import sys
+import copy
 import random
+import tempfile
 import numpy as np
 import math
-import matplotlib.pyplot as plt
-from PIL import Image, ImageDraw
+from concurrent.futures import ProcessPoolExecutor
 #------------------------------------------------------------------------------#
 
 
@@ -30,6 +32,9 @@ from PIL import Image, ImageDraw
 # import package modules here                                                  #
 #------------------------------------------------------------------------------#
 import sources.utility.util as util
+import sources.learner.columnar_data_set as cds
+import sources.learner.histogram_split as hs
+import sources.learner.flat_tree as ft
 #------------------------------------------------------------------------------#
 
 
@@ -60,139 +65,84 @@ class DNode:
 # CART tree classifier                                                         #
 #------------------------------------------------------------------------------#
 class CART:
-      def get_value_count(self, data_set, col):
-          values = {}
-          if len(data_set) == 0:
-             return values
-          for row in data_set:
-              value = row[col]
-              if value not in values:
-                 values[value] = 0
-              values[value] += 1
-          return values
-
-      def get_results_count(self, data_set):
-          results = {}
-          if len(data_set) == 0:
-             return results
-          last_col = len(data_set[0]) - 1
-          for row in data_set:
-              result = row[last_col]
-              if result not in results:
-                 results[result] = 0
-              results[result] += 1
-          return results
-
-      def compute_entropy(self, data_set):
-          results = self.get_results_count(data_set)
-          n = len(data_set)
-          ent = 0.0
-          for v in results.values():
-              p = float(v)/float(n)
-              ent = ent + (p * math.log(p, 2))
-          ent = -ent
-          return ent
-
-      def compute_gini_impurity(self, data_set):
-          results = self.get_results_count(data_set)
-          n = len(data_set)
-          gi = 0.0
-          for v in results.values():
-              gi += np.square(float(v)/float(n))
-          gi = 1.0 - gi
-          return gi
-
-      def compute_impurity(self, data_set):
-          return self.compute_entropy(data_set)
-
-      def binary_classify_based_on_value_comparison(self, data_set, col, value):
-          set1 = []
-          set2 = []
-          for row in data_set:
-              if row[col] >= value:
-                 set1.append(row)
-              else:
-                 set2.append(row)
-          return set1, set2
-
-      def banary_classfy_based_on_value_equality(self, data_set, col, value):
-          set1 = []
-          set2 = []
-          for row in data_set:
-              if row[col] == value:
-                 set1.append(row)
-              else:
-                 set2.append(row)
-          return set1, set2
-
-      def binary_classify_data_set(self, data_set, col, value):
-          binary_classifier = None
-          if isinstance(value, int) or isinstance(value, float):
-             binary_classifier = self.binary_classify_based_on_value_comparison
-          else:
-             binary_classifier = self.banary_classfy_based_on_value_equality
-          return binary_classifier(data_set, col, value)
+      # data members
+      split_engine = None
+      max_bins = None
+      rng = None
+
+      # split_engine is either 'exact', which tries every distinct value of
+      # every column, or 'histogram', which bins every column once into at
+      # most max_bins buckets, rng is the random generator of the tree
+      def __init__(self, split_engine='exact', max_bins=255, rng=None):
+          self.split_engine = split_engine
+          self.max_bins = max_bins
+          self.rng = rng if rng != None else random.Random()
 
       def select_random_subset_of_features(self, col_count):
           column_list = []
           for i in range(0, col_count):
               column_list.append(i)
           r_col_count = int(math.sqrt(col_count))
-          r_col_list = random.sample(column_list, r_col_count)
+          r_col_list = self.rng.sample(column_list, r_col_count)
           r_col_dict = {}
-          for i in range(0, r_col_count):
-              r_col_dict[i] = i
+          for col in sorted(r_col_list):
+              r_col_dict[col] = col
           return r_col_dict
 
-      def get_best_partition(self, data_set):
-          col_count = len(data_set[0]) - 1
+      # grow the tree over the given rows of the binned data set, weights
+      # holds the number of times each row was drawn into the sample
+      def recursive_build_tree(self, splitter, index, weights):
+          col_count = len(splitter.binner.n_bins)
           r_col_dict = self.select_random_subset_of_features(col_count)
-          set_impurity = self.compute_impurity(data_set)
-          best_gain = 0.0;
-          best_combination = None
-          best_partition = None
-          for col in range(0, col_count):
-              if col not in r_col_dict:
-                 continue
-
-              values = self.get_value_count(data_set, col)
-              for k in values.keys():
-                  # there are missing values, simply skip over these values
-                  if k == '?':
-                     continue
-                  set1, set2 = self.binary_classify_data_set(data_set, col, k)
-                  set1_impurity = self.compute_impurity(set1)
-                  set2_impurity = self.compute_impurity(set2)
-                  p = float(len(set1)) / float(len(data_set))
-                  weighted_impurity = (p * set1_impurity) + \
-                                                   ((1-p) * set2_impurity)
-                  gain = set_impurity - weighted_impurity
-                  if gain > best_gain and len(set1) > 0 and len(set2) > 0:
-                     best_gain = gain
-                     best_combination = (col, k)
-                     best_partition = (set1, set2)
-          return best_gain, best_combination, best_partition
-
-      def recursive_build_tree(self, data_set):
-          if len(data_set) == 0:
-             return DNode(leaf_node=True)
-
           best_gain, best_combination, best_partition = \
-                                               self.get_best_partition(data_set)
+                   splitter.get_best_partition(index, list(r_col_dict.keys()),
+                                               weights)
           if best_gain > 0.0:
-             tb = self.recursive_build_tree(best_partition[0])
-             fb = self.recursive_build_tree(best_partition[1])
+             tb = self.recursive_build_tree(splitter, best_partition[0],
+                                            weights)
+             fb = self.recursive_build_tree(splitter, best_partition[1],
+                                            weights)
              pnode = DNode(col=best_combination[0], value=best_combination[1], \
                            tnode=tb, fnode=fb, leaf_node=False)
              return pnode
           else:
-             results_dict = self.get_results_count(data_set)
+             results_dict = splitter.get_results(index, weights)
              lnode = DNode(results=results_dict, leaf_node=True)
              return lnode
 
-      def build_tree(self, data_set):
-          root = self.recursive_build_tree(data_set)
-          return root
+      def build_tree(self, splitter, index, weights=None):
+          if len(index) == 0:
+             return DNode(leaf_node=True)
+          return self.recursive_build_tree(splitter, index, weights)
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# splitter of the training data, set once in every worker process              #
+#------------------------------------------------------------------------------#
+worker_splitter = None
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# initialize a worker process of the forest training pool, the binned matrix   #
+# and the labels are mapped read only from the files written by the parent,    #
+# so that all the workers share the pages of a single copy                     #
+#------------------------------------------------------------------------------#
+def init_worker(binner, bin_mat_file, labels_file):
+    global worker_splitter
+    binner.bin_mat = np.load(bin_mat_file, mmap_mode='r')
+    binner.labels = np.load(labels_file, mmap_mode='r')
+    worker_splitter = hs.HistogramSplitter(binner)
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# grow one tree of the forest in a worker process                              #
+#------------------------------------------------------------------------------#
+def grow_tree_in_worker(split_engine, max_bins, seed):
+    rfo = RandomForest(split_engine, max_bins)
+    return rfo.grow_tree(worker_splitter, seed)
 #------------------------------------------------------------------------------#
 
 
@@ -200,10 +150,159 @@ class CART:
 # RandomForest Class                                                           #
 #------------------------------------------------------------------------------#
 class RandomForest:
-      # contruct the classification tree for training data
-      def build_tree(self, data_set):
-          cart = CART()
-          return cart.build_tree(data_set)
+      # data members
+      split_engine = None
+      max_bins = None
+      n_jobs = None
+      seed = None
+      total_trees = None
+      patience = None
+      tol = None
+      forest_seed = None
+      c_data = None
+      splitter = None
+      sample_counts = None
+      oob_votes = None
+      oob_errors = None
+      oob_accuracy = None
+      oob_class_error = None
+
+      # init method, n_jobs is the number of worker processes which grow the
+      # trees (-1 for all cores) and seed the master seed of the forest.
+      # with patience, growth stops once the out-of-bag error has not
+      # improved by more than tol over the last patience trees
+      def __init__(self, split_engine='exact', max_bins=255, n_jobs=1,
+                   seed=None, total_trees=200, patience=None, tol=0.0):
+          self.split_engine = split_engine
+          self.max_bins = max_bins
+          self.n_jobs = n_jobs
+          self.seed = seed
+          self.total_trees = total_trees
+          self.patience = patience
+          self.tol = tol
+
+      # without max_bins every distinct value of a column is a bin of its
+      # own, which makes the histogram search exact
+      def get_max_bins(self):
+          if self.split_engine == 'histogram':
+             return self.max_bins
+          return None
+
+      # contruct the classification tree for the given rows of the binned
+      # training data
+      def build_tree(self, splitter, index, weights=None, rng=None):
+          cart = CART(self.split_engine, self.max_bins, rng)
+          return cart.build_tree(splitter, index, weights)
+
+      # draw a bootstrap sample of the training data, with replacement, as
+      # the number of times every row is drawn, rows drawn zero times are
+      # out-of-bag for the tree
+      def draw_sample_counts(self, rows, seed):
+          draws = np.random.default_rng(seed).integers(0, rows, rows)
+          counts = np.bincount(draws, minlength=rows)
+          return counts.astype(np.min_scalar_type(rows))
+
+      # grow a tree on a bootstrap sample of the training data, everything
+      # random about the tree is drawn from its own seed
+      def grow_tree(self, splitter, seed):
+          counts = self.draw_sample_counts(len(splitter.labels), seed)
+          index = np.flatnonzero(counts)
+          root = self.build_tree(splitter, index, counts, random.Random(seed))
+          return root, counts
+
+      # derive an independent seed for trees first, ..., first+count-1 from
+      # the master seed, so that the forest does not depend on the number of
+      # workers nor on how many trees were added at a time
+      def get_tree_seeds(self, first, count):
+          seeds = np.random.SeedSequence(self.forest_seed).generate_state(
+                                                                first + count)
+          return [int(s) for s in seeds[first:]]
+
+      # number of worker processes to use
+      def get_n_jobs(self):
+          if self.n_jobs == None or self.n_jobs < 1:
+             return os.cpu_count()
+          return self.n_jobs
+
+      # grow the trees one after another, or across a pool of worker
+      # processes, the workers only get the small binning tables pickled and
+      # map the binned training matrix and the labels from files, trees are
+      # yielded in the order of their seeds as soon as they are grown
+      def grow_trees(self, splitter, seeds):
+          n_jobs = self.get_n_jobs()
+          if n_jobs == 1:
+             for s in seeds:
+                 yield self.grow_tree(splitter, s)
+             return
+
+          binner = splitter.binner
+          w_binner = copy.copy(binner)
+          w_binner.bin_mat = None
+          w_binner.labels = None
+
+          n = len(seeds)
+          with tempfile.TemporaryDirectory() as tmp_dir:
+             bin_mat_file = util.share_array(binner.bin_mat,
+                                   os.path.join(tmp_dir, 'bin_mat.npy'))
+             labels_file = util.share_array(binner.labels,
+                                   os.path.join(tmp_dir, 'labels.npy'))
+             with ProcessPoolExecutor(max_workers=n_jobs,
+                                      initializer=init_worker,
+                                      initargs=(w_binner, bin_mat_file,
+                                                labels_file)) as pool:
+                trees = pool.map(grow_tree_in_worker, [self.split_engine] * n,
+                                 [self.max_bins] * n, seeds,
+                                 chunksize=max(1, n // (4 * n_jobs)))
+                try:
+                   for tree in trees:
+                       yield tree
+                finally:
+                   # growth stopped early, drop the trees not yet started
+                   pool.shutdown(cancel_futures=True)
+
+      # add the votes of a tree for the training rows which are out-of-bag
+      # for it
+      def add_oob_votes(self, root, counts, x_mat):
+          oob = np.flatnonzero(counts == 0)
+          flat_tree = ft.FlatTree().compile(root, self.c_data)
+          self.oob_votes[oob, flat_tree.predict(x_mat[oob])] += 1
+
+      # out-of-bag error of the forest grown so far, rows which were not yet
+      # out-of-bag for any tree count as errors, so that the few rows voted
+      # on by the first trees do not give a too optimistic error
+      def get_oob_error(self):
+          voted = np.sum(self.oob_votes, axis=1) > 0
+          predicted = np.argmax(self.oob_votes, axis=1)
+          correct = voted & (predicted == self.c_data.labels)
+          return 1.0 - float(np.mean(correct))
+
+      # stop growing once the best out-of-bag error of the last patience
+      # trees is no better, by more than tol, than the best one before them
+      def stop_growing(self):
+          if self.patience == None or len(self.oob_errors) <= self.patience:
+             return False
+          recent = min(self.oob_errors[-self.patience:])
+          before = min(self.oob_errors[:-self.patience])
+          return recent > before - self.tol
+
+      # out-of-bag accuracy and error of every class, over the training rows
+      # which were out-of-bag for at least one tree
+      def get_oob_score(self):
+          classes = self.c_data.classes
+          voted = np.flatnonzero(np.sum(self.oob_votes, axis=1) > 0)
+          labels = self.c_data.labels[voted]
+          correct = np.argmax(self.oob_votes[voted], axis=1) == labels
+
+          accuracy = 0.0
+          if len(voted) > 0:
+             accuracy = float(np.mean(correct))
+          class_error = {}
+          for c in range(0, len(classes)):
+              in_class = labels == c
+              if np.any(in_class):
+                 class_error[classes[c]] = \
+                                      1.0 - float(np.mean(correct[in_class]))
+          return accuracy, class_error
 
       # preprocess the data set
       def preprocess_data_set(self, data_set):
@@ -232,51 +331,52 @@ class RandomForest:
               gene_list.append(row[0])
           return gene_list
 
-      def get_class(self, results):
-          cur_v = 0
-          cur_k = None
-          for k, v in results.items():
-              if v > cur_v:
-                 cur_v = v
-                 cur_k = k
-          return cur_k
-
-      def select_branch_based_on_value_comparison(self, tree, row):
-          node = None
-          t_col = tree.col
-          t_val = tree.value
-          if row[t_col] >= t_val:
-             node = tree.tnode
-          else:
-             node = tree.fnode
-          return node
-
-      def select_branch_based_on_value_equality(self, tree, row):
-          node = None
-          t_col = tree.col
-          t_val = tree.value
-          if row[t_col] == t_val:
-             node = tree.tnode
-          else:
-             node = tree.fnode
-          return node
-
-      def select_branch(self, tree, row):
-          cur_select_branch = None
-          t_val = tree.value
-          if isinstance(t_val, int) or isinstance(t_val, float):
-             cur_select_branch = self.select_branch_based_on_value_comparison
-          else:
-             cur_select_branch = self.select_branch_based_on_value_equality
-          return cur_select_branch(tree, row)
-
-      # recursively classify the given test data item
-      def recursive_classify(self, tree, row):
-          if tree.leaf_node == False:
-             node = self.select_branch(tree, row)
-             return self.recursive_classify(node, row)
-          else:
-             return tree
+      # hyperparameters which change the learned forest
+      def get_params(self):
+          return {'split_engine': self.split_engine,
+                  'max_bins': self.max_bins, 'seed': self.seed,
+                  'total_trees': self.total_trees, 'patience': self.patience,
+                  'tol': self.tol}
+
+      # compile a learned tree, loaded trees are compiled already
+      def compile_tree(self, root):
+          if isinstance(root, ft.FlatTree):
+             return root
+          return ft.FlatTree().compile(root, self.c_data)
+
+      # arrays and meta data to save the learned forest in a model store, the
+      # arrays of all the compiled trees are concatenated and tree t owns the
+      # nodes tree_offsets[t] to tree_offsets[t+1]-1
+      def get_model_arrays(self, roots):
+          tree_arrays = [self.compile_tree(root).get_arrays() for root in roots]
+          arrays = {}
+          for name in tree_arrays[0].keys():
+              arrays[name] = np.concatenate([a[name] for a in tree_arrays])
+          sizes = [len(a['feature']) for a in tree_arrays]
+          arrays['tree_offsets'] = np.concatenate(([0], np.cumsum(sizes)))
+          numeric, categories, classes = self.c_data.get_encoding()
+          arrays['numeric_cols'] = numeric
+          meta = {'categories': categories, 'classes': classes,
+                  'oob_accuracy': self.oob_accuracy,
+                  'oob_class_error': self.oob_class_error}
+          return arrays, meta
+
+      # restore the forest saved by get_model_arrays, as compiled trees
+      def set_model_arrays(self, arrays, meta):
+          self.c_data = cds.ColumnarDataSet().set_encoding(
+                     arrays['numeric_cols'], meta['categories'], meta['classes'])
+          self.oob_accuracy = meta['oob_accuracy']
+          self.oob_class_error = meta['oob_class_error']
+
+          offsets = arrays['tree_offsets']
+          names = ft.FlatTree().get_arrays().keys()
+          roots = []
+          for t in range(0, len(offsets) - 1):
+              tree_arrays = {}
+              for name in names:
+                  tree_arrays[name] = arrays[name][offsets[t]:offsets[t+1]]
+              roots.append(ft.FlatTree().set_arrays(tree_arrays))
+          return roots
 
       # classify the test data
       def classify(self, roots, test_data):
@@ -286,45 +386,79 @@ class RandomForest:
           # preprocess test data
           processed_test_data = self.preprocess_data_set(test_data)
 
-          # classify test data
+          # select class from each tree for all the rows at once, on the
+          # compiled trees
+          x_mat = self.c_data.transform(processed_test_data)
+          rows = np.arange(len(processed_test_data))
+          votes = np.zeros((len(rows), len(self.c_data.classes)),
+                           dtype=np.int64)
+          for t in range(0, len(roots)):
+              flat_tree = self.compile_tree(roots[t])
+              votes[rows, flat_tree.predict(x_mat)] += 1
+
+          # select the class which is most frequently selected
+          # in the above classification process
+          class_codes = np.argmax(votes, axis=1)
           class_dict = {}
           for r in range(0, len(processed_test_data)):
-              row = processed_test_data[r]
               cur_gene = gene_list[r]
-              # select class for from each tree for the 'row'
-              tree_dict = {}
-              for t in range(0, len(roots)):
-                  node = self.recursive_classify(roots[t], row)
-                  cc = self.get_class(node.results)
-                  if cc not in tree_dict:
-                     tree_dict[cc] = 0
-                  tree_dict[cc] += 1
-
-              # select the class which is most frequently selected
-              # in the above classification process
-              c_val = 0
-              for k, v in tree_dict.items():
-                  if v > c_val:
-                     c_val = v
-                     class_dict[cur_gene] = k
+              class_dict[cur_gene] = self.c_data.classes[class_codes[r]]
 
           return class_dict
 
+      # warm start, grow count more trees on the training data of the last
+      # call to learn and add them to the learned trees roots. the binned
+      # training data and bootstrap samples are not part of a saved model,
+      # so a forest loaded with set_model_arrays cannot be grown further
+      def add_trees(self, roots, count):
+          if self.splitter is None or self.sample_counts is None:
+             print("\nError: trees can only be added to a forest learned " +
+                   "in this process, not to a loaded one. exiting " +
+                   "gracefully.\n")
+             sys.exit()
+          roots = list(roots)
+          seeds = self.get_tree_seeds(len(roots), count)
+
+          # sample_counts[t] records the bootstrap sample, and so the
+          # out-of-bag rows, of tree t, every tree votes for its out-of-bag
+          # rows as soon as it is grown
+          x_mat = self.c_data.get_matrix()
+          sample_counts = list(self.sample_counts)
+          for root, counts in self.grow_trees(self.splitter, seeds):
+              roots.append(root)
+              sample_counts.append(counts)
+              self.add_oob_votes(root, counts, x_mat)
+              self.oob_errors.append(self.get_oob_error())
+              if self.stop_growing():
+                 break
+          self.sample_counts = np.array(sample_counts)
+          self.oob_accuracy, self.oob_class_error = self.get_oob_score()
+
+          # return roots of all the learned trees
+          return roots
+
       # ask classification tree learner to learn from training data
       def learn(self, training_data):
           # preprocess the data set
           processed_data_set = self.preprocess_data_set(training_data)
 
-          # train total_trees number of trees
-          total_trees = 200
-          # randomly select 2/3rd of data set items for every tree to be 
-          # trained
-          r_len = 2 * int(len(training_data)/3)
-          roots = []
-          for i in range(0, total_trees):
-              sampled_data_set = random.sample(processed_data_set, r_len)
-              roots.append(self.build_tree(sampled_data_set))
+          # bin the data set only once, every tree is then trained on a
+          # bootstrap sample given by the indices and sample counts of its
+          # drawn rows
+          self.c_data = cds.ColumnarDataSet().fit(processed_data_set)
+          binner = hs.FeatureBinner(self.get_max_bins()).fit(self.c_data)
+          self.splitter = hs.HistogramSplitter(binner)
+
+          self.forest_seed = self.seed
+          if self.forest_seed == None:
+             self.forest_seed = random.getrandbits(64)
+          rows = self.c_data.rows
+          self.sample_counts = np.zeros((0, rows),
+                                        dtype=np.min_scalar_type(rows))
+          self.oob_votes = np.zeros((rows, len(self.c_data.classes)),
+                                    dtype=np.int64)
+          self.oob_errors = []
 
-          # return roots of learned trees
-          return roots
+          # train total_trees number of trees
+          return self.add_trees([], self.total_trees)
 #------------------------------------------------------------------------------#
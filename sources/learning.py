@@ -48,12 +48,16 @@ def machine_learning_system(argv):
     fho.open_training_data_file(d_file)
     fho.open_test_data_file(t_file)
 
-    # read training data and test data files
-    train_data = fho.read_training_data_file()
+    # read training data and test data files, learners which stream their
+    # training data get it chunk by chunk while they learn
+    if kind in lr.Learner.streamed_kinds:
+       train_data = fho.read_training_data_chunks(lr.Learner.chunk_rows)
+    else:
+       train_data = fho.read_training_data_file()
     test_data = fho.read_test_data_file()
 
-    # construct learner object
-    learner = lr.Learner(train_data, test_data, kind)
+    # construct learner object, the training data file keys saved models
+    learner = lr.Learner(train_data, test_data, kind, d_file)
 
     # ask machine to learn from train data and make predictions for test data 
     learner.learn_and_predict()
@@ -0,0 +1,224 @@
+################################################################################
+#                                                                              #
+#                          Distance Kernel Module:                             #
+#                                                                              #
+################################################################################
+#                                                                              #
+# This module computes distances between the samples of the clustering         #
+# learners: pairwise distances between two sets of samples, the distance of    #
+# every sample to the closest sample of a set, distances of paired samples,    #
+# and condensed pairwise distance matrices, which may be written straight      #
+# into a memory-mapped .npy file.                                              #
+#                                                                              #
+# Distances are computed in tiles of at most TILE_BYTES bytes, through NumPy   #
+# matrix products where the metric allows, and the tiles are spread across a   #
+# pool of threads, as NumPy releases the GIL while it computes.                #
+#                                                                              #
+# Metrics are 'euclidean', 'sqeuclidean', 'manhattan' and 'cosine'.            #
+#                                                                              #
+################################################################################
+
+
+
+#------------------------------------------------------------------------------#
+# import built-in system modules here                                          #
+#------------------------------------------------------------------------------#
+import os
+import sys
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# memory budget, in bytes, of a tile of distances, small enough to stay in     #
+# cache                                                                        #
+#------------------------------------------------------------------------------#
+TILE_BYTES = 1 << 22
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# supported metrics                                                            #
+#------------------------------------------------------------------------------#
+METRICS = ['euclidean', 'sqeuclidean', 'manhattan', 'cosine']
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# exit on an unknown metric                                                    #
+#------------------------------------------------------------------------------#
+def check_metric(metric):
+    if metric not in METRICS:
+       print("\nError: unknown distance metric " + str(metric) +
+             ". exiting gracefully.\n")
+       sys.exit()
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# number of threads to use, None or less than 1 for all cores                  #
+#------------------------------------------------------------------------------#
+def get_n_threads(n_threads):
+    if n_threads == None or n_threads < 1:
+       return os.cpu_count()
+    return n_threads
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# rows of x per tile against all the rows of y                                 #
+#------------------------------------------------------------------------------#
+def get_tile_rows(y_rows, tile_bytes=TILE_BYTES):
+    return max(1, tile_bytes // (8 * max(1, y_rows)))
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# distances of every sample of x_mat to every sample of y_mat, a single tile   #
+#------------------------------------------------------------------------------#
+def compute_tile(x_mat, y_mat, metric='euclidean'):
+    if metric == 'manhattan':
+       d_mat = np.zeros((len(x_mat), len(y_mat)))
+       for c in range(0, x_mat.shape[1]):
+           d_mat += np.absolute(x_mat[:, c, None] - y_mat[None, :, c])
+       return d_mat
+
+    d_mat = np.dot(x_mat, y_mat.T)
+    if metric == 'cosine':
+       x_norm = np.sqrt(np.einsum('ij,ij->i', x_mat, x_mat))
+       y_norm = np.sqrt(np.einsum('ij,ij->i', y_mat, y_mat))
+       x_norm[x_norm == 0.0] = 1.0
+       y_norm[y_norm == 0.0] = 1.0
+       d_mat /= x_norm[:, None]
+       d_mat /= y_norm
+       return np.maximum(1.0 - d_mat, 0.0)
+
+    d_mat *= -2.0
+    d_mat += np.einsum('ij,ij->i', y_mat, y_mat)
+    d_mat += np.einsum('ij,ij->i', x_mat, x_mat)[:, None]
+    np.maximum(d_mat, 0.0, out=d_mat)
+    if metric == 'euclidean':
+       np.sqrt(d_mat, out=d_mat)
+    return d_mat
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# call func(s, e) for the tiles [s, e) of rows, across n_threads threads       #
+#------------------------------------------------------------------------------#
+def run_tiles(func, rows, tile_rows, n_threads):
+    starts = range(0, rows, tile_rows)
+    tiles = [(s, min(rows, s + tile_rows)) for s in starts]
+    n_threads = min(get_n_threads(n_threads), len(tiles))
+    if n_threads <= 1:
+       return [func(s, e) for s, e in tiles]
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+         return list(pool.map(lambda tile: func(*tile), tiles))
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# distances of every sample of x_mat to every sample of y_mat                  #
+#------------------------------------------------------------------------------#
+def compute_pairwise_distances(x_mat, y_mat, metric='euclidean',
+                               n_threads=None):
+    check_metric(metric)
+    x_mat = np.asarray(x_mat, dtype=np.float64)
+    y_mat = np.asarray(y_mat, dtype=np.float64)
+    d_mat = np.empty((len(x_mat), len(y_mat)))
+
+    def fill(s, e):
+        d_mat[s:e] = compute_tile(x_mat[s:e], y_mat, metric)
+
+    run_tiles(fill, len(x_mat), get_tile_rows(len(y_mat)), n_threads)
+    return d_mat
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# closest sample of y_mat to every sample of x_mat, and its distance           #
+#------------------------------------------------------------------------------#
+def compute_closest(x_mat, y_mat, metric='euclidean', n_threads=None):
+    check_metric(metric)
+    x_mat = np.asarray(x_mat, dtype=np.float64)
+    y_mat = np.asarray(y_mat, dtype=np.float64)
+    index = np.empty(len(x_mat), dtype=np.int64)
+    dist = np.empty(len(x_mat))
+
+    def fill(s, e):
+        d_mat = compute_tile(x_mat[s:e], y_mat, metric)
+        index[s:e] = np.argmin(d_mat, axis=1)
+        dist[s:e] = d_mat[np.arange(e - s), index[s:e]]
+
+    run_tiles(fill, len(x_mat), get_tile_rows(len(y_mat)), n_threads)
+    return index, dist
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# distance of every sample of x_mat to the sample in the same row of y_mat,    #
+# or to the single sample y_mat                                                #
+#------------------------------------------------------------------------------#
+def compute_paired_distances(x_mat, y_mat, metric='euclidean'):
+    check_metric(metric)
+    x_mat = np.asarray(x_mat, dtype=np.float64)
+    y_mat = np.asarray(y_mat, dtype=np.float64)
+    if metric == 'cosine':
+       dot = np.sum(x_mat * y_mat, axis=-1)
+       x_norm = np.sqrt(np.sum(np.square(x_mat), axis=-1))
+       y_norm = np.sqrt(np.sum(np.square(y_mat), axis=-1))
+       norm = np.where(x_norm == 0.0, 1.0, x_norm) * \
+              np.where(y_norm == 0.0, 1.0, y_norm)
+       return np.maximum(1.0 - dot / norm, 0.0)
+
+    d_mat = x_mat - y_mat
+    if metric == 'manhattan':
+       return np.sum(np.absolute(d_mat), axis=-1)
+    sq = np.einsum('...j,...j->...', d_mat, d_mat)
+    if metric == 'euclidean':
+       return np.sqrt(sq)
+    return sq
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# pairwise distances of the samples of i_mat as a condensed matrix, the        #
+# distance of samples i < j is at position n*i - i*(i+1)/2 + (j-i-1). with     #
+# out_file the matrix is written to that memory-mapped .npy file.              #
+#                                                                              #
+# the smallest distances decide the order of agglomerative merges, so the      #
+# euclidean metrics are computed from explicit differences here: the matrix    #
+# product identity loses near duplicate samples far from the origin to         #
+# cancellation                                                                 #
+#------------------------------------------------------------------------------#
+def compute_condensed_distances(i_mat, metric='euclidean', n_threads=None,
+                                out_file=None):
+    check_metric(metric)
+    i_mat = np.asarray(i_mat, dtype=np.float64)
+    n = len(i_mat)
+    size = n * (n - 1) // 2
+    if out_file != None:
+       d_arr = np.lib.format.open_memmap(out_file, mode='w+',
+                                         dtype=np.float64, shape=(size,))
+    else:
+       d_arr = np.empty(size)
+
+    # row i of a tile keeps its distances to the samples after it
+    def fill(s, e):
+        if metric in ['euclidean', 'sqeuclidean']:
+           for i in range(s, e):
+               p = n * i - i * (i + 1) // 2
+               d_arr[p:p + n - i - 1] = compute_paired_distances(
+                                               i_mat[i+1:], i_mat[i], metric)
+           return
+        d_mat = compute_tile(i_mat[s:e], i_mat[s:], metric)
+        for i in range(s, e):
+            p = n * i - i * (i + 1) // 2
+            d_arr[p:p + n - i - 1] = d_mat[i - s, i - s + 1:]
+
+    run_tiles(fill, max(0, n - 1), get_tile_rows(n), n_threads)
+    if out_file != None:
+       d_arr.flush()
+    return d_arr
+#------------------------------------------------------------------------------#
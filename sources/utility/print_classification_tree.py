@@ -14,8 +14,6 @@
 import sys
 import numpy as np
 import math
-import matplotlib.pyplot as plt
-from PIL import Image, ImageDraw
 #------------------------------------------------------------------------------#
 
 
@@ -76,6 +74,9 @@ class PrintTree:
           if tree == None:
              return
 
+          # PIL is only needed for rendering, import it on demand
+          from PIL import Image, ImageDraw
+
           w = self.get_width(tree) * 1000
           h = self.get_depth(tree) * 1000 + 1200
 
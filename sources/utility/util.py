@@ -20,7 +20,6 @@ import os
 import sys
 import csv
 import numpy as np
-from scipy.spatial import distance as sci_dist
 from enum import Enum
 #------------------------------------------------------------------------------#
 
@@ -28,7 +27,7 @@ from enum import Enum
 #------------------------------------------------------------------------------#
 # import package modules here                                                  #
 #------------------------------------------------------------------------------#
-import sources.utility.print_classification_tree as pct
+import sources.utility.distance_kernel as dk
 #------------------------------------------------------------------------------#
 
 
@@ -55,14 +54,28 @@ def compute_mean_squared_error(o_vec, p_vec):
 #------------------------------------------------------------------------------#
 
 
+#------------------------------------------------------------------------------#
+# write an array to a memory-mapped file, worker processes attach to it by     #
+# file name                                                                    #
+#------------------------------------------------------------------------------#
+def share_array(arr, file_name):
+    m_arr = np.lib.format.open_memmap(file_name, mode='w+', dtype=arr.dtype,
+                                      shape=arr.shape,
+                                      fortran_order=np.isfortran(arr))
+    m_arr[...] = arr
+    m_arr.flush()
+    del m_arr
+    return file_name
+#------------------------------------------------------------------------------#
+
+
 #------------------------------------------------------------------------------#
 #------------------------------------------------------------------------------#
 def compute_sum_squared_error(i_mat, cluster, final_centroids):
     sse = 0.0
     for key, val_list in cluster.items():
         centroid = final_centroids[key]
-        for index in val_list:
-            sse += sci_dist.euclidean(i_mat[index], centroid)
+        sse += np.sum(dk.compute_paired_distances(i_mat[val_list], centroid))
     return sse
 #------------------------------------------------------------------------------#
 
@@ -242,6 +255,8 @@ def parse_command_line_arguments(argv):
        print("                  Enter 4 for k-mean clustering")
        print("                  Enter 5 for decision tree based classification")
        print("                  Enter 6 for random forest based classification")
+       print("                  Enter 7 for k-mean clustering of every k up " +
+             "to 10")
        print("TrainingData.txt: Choose it based on 'Kind' from './data_set' " +
              "directory")
        print("TestData.txt:     Choose it based on 'Kind' from './data_set' " +
@@ -330,7 +345,25 @@ def print_k_mean_clustering_output(cluster, sse):
 
 #------------------------------------------------------------------------------#
 #------------------------------------------------------------------------------#
-def print_hierarchical_clustering_output(cluster_list):
+def print_k_sweep_output(report):
+    os.system("clear")
+    print("\n\n")
+    print("------------------------------------------------------------")
+    print("K Mean Clustering Of Every K For The Data Set:")
+    print("        http://guidetodatamining.com/guide/data/mpg.txt")
+    print("------------------------------------------------------------")
+    print("\n")
+    print("k, clusters, sum squared error, silhouette, seconds")
+    print("------------------------------------------------------------")
+    for k, clusters, sse, silhouette, seconds in report:
+        print(k, clusters, sse, silhouette, round(seconds, 3))
+    print("\n")
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+def print_hierarchical_clustering_output(hierarchy, levels=20):
     os.system("clear")
     print("\n\n")
     print("------------------------------------------------------------")
@@ -338,14 +371,20 @@ def print_hierarchical_clustering_output(cluster_list):
     print("      dog.scv data-set from http://guidetodatamining.com/chapter-8/")
     print("------------------------------------------------------------")
     print("\n")
+    print("Linkage Matrix:")
+    print("merge, node 1, node 2, distance, size")
+    print("------------------------------------------------------------")
+    for i in range(0, len(hierarchy.z_mat)):
+        z = hierarchy.z_mat[i]
+        print(i, int(z[0]), int(z[1]), z[2], int(z[3]))
+    print("\n")
     print("\n")
     print("Cluster Hierarchy:")
     print("\n")
-    r = 0
-    for cluster in cluster_list:
-        r += 1
-        print("Hierarchy ", r)
-        for key, v_list in cluster.items():
+    # only the top levels, rebuilt one at a time
+    for r in range(max(0, hierarchy.rows - levels), hierarchy.rows):
+        print("Hierarchy ", r + 1)
+        for key, v_list in hierarchy.get_level(r).items():
             print(key,":\t", v_list)
         print("\n")
     print("\n")
@@ -420,3 +459,34 @@ def print_random_forest_output(test_data, roots, class_dict,
     print("Number of genes correctly classified:    ", succ)
     print("Number of genes incorrectly classified:  ", fail)
 #------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+def print_random_forest_oob_output(oob_accuracy, oob_class_error):
+    print("\n\n")
+    print("------------------------------------------------")
+    print("Out-of-bag estimate on training data:")
+    print("------------------------------------------------")
+    print("Out-of-bag accuracy:  ", oob_accuracy)
+    print("\n")
+    print("class, out-of-bag error")
+    print("------------------------------------------------")
+    for k, v in oob_class_error.items():
+        print("'"+k+"'", v)
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------#
+def print_k_mean_restart_output(restarts):
+    print("------------------------------------------------")
+    print("k-mean restarts:")
+    print("------------------------------------------------")
+    print("restart, seed, sum squared error, seconds")
+    print("------------------------------------------------")
+    for r in range(0, len(restarts)):
+        seed, sse, seconds = restarts[r]
+        print(r, seed, sse, round(seconds, 3))
+    print("\n")
+#------------------------------------------------------------------------------#
@@ -0,0 +1,41 @@
+################################################################################
+#                                                                              #
+#                      Hierarchical Clustering Tests:                          #
+#                                                                              #
+################################################################################
+
+
+
+#------------------------------------------------------------------------------#
+# import built-in system modules here                                          #
+#------------------------------------------------------------------------------#
+import unittest
+import numpy as np
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# import package modules here                                                  #
+#------------------------------------------------------------------------------#
+import sources.learner.hierarchical_clustering as hc
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# TwoStageClusterTest Class                                                    #
+#------------------------------------------------------------------------------#
+class TwoStageClusterTest(unittest.TestCase):
+      # the sizes of the linkage matrix count samples, not micro-clusters,
+      # whatever the engine agglomerating the micro-clusters
+      def test_root_holds_all_samples(self):
+          i_mat = np.random.default_rng(0).normal(size=(3000, 3))
+          for engine in ['nn_chain', 'lance_williams']:
+              hco = hc.HierarchicalCluster('average', engine, n_micro=50,
+                                           seed=1)
+              hierarchy = hco.hierarchical_cluster(i_mat)
+              self.assertEqual(hierarchy.z_mat[-1, 3], len(i_mat))
+#------------------------------------------------------------------------------#
+
+
+if __name__ == '__main__':
+   unittest.main()
@@ -0,0 +1,53 @@
+################################################################################
+#                                                                              #
+#                        Linear Regression Tests:                              #
+#                                                                              #
+################################################################################
+
+
+
+#------------------------------------------------------------------------------#
+# import built-in system modules here                                          #
+#------------------------------------------------------------------------------#
+import unittest
+import numpy as np
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# import package modules here                                                  #
+#------------------------------------------------------------------------------#
+import sources.learner.linear_regression as lr
+#------------------------------------------------------------------------------#
+
+
+#------------------------------------------------------------------------------#
+# LSLRTest Class                                                               #
+#------------------------------------------------------------------------------#
+class LSLRTest(unittest.TestCase):
+      # a duplicated column makes X^X singular, yet rounding usually leaves it
+      # positive definite. the cholesky solver must notice and fall back to
+      # the minimum norm solution, which splits the weight evenly
+      def test_rank_deficient_falls_back(self):
+          for seed in range(8):
+              rng = np.random.default_rng(seed)
+              phi_mat = np.column_stack((np.ones(200), rng.normal(size=(200, 3))
+                                         * rng.uniform(1, 100, 3)))
+              t_vec = np.dot(phi_mat, [1.0, 2.0, 3.0, 4.0]) + \
+                      rng.normal(size=200)
+              phi_mat = np.column_stack((phi_mat, phi_mat[:, 2]))
+              w_vec = lr.LSLR('lstsq', 0.0).least_square_linear_regression(
+                                                               phi_mat, t_vec)
+              lslr = lr.LSLR('cholesky', 0.0)
+              c_vec = lslr.least_square_linear_regression(phi_mat, t_vec)
+              h_vec = lslr.least_square_from_hessian(
+                                   np.dot(phi_mat.T, phi_mat),
+                                   np.dot(phi_mat.T, t_vec))
+              np.testing.assert_allclose(c_vec, w_vec, atol=1e-6)
+              np.testing.assert_allclose(h_vec, w_vec, atol=1e-6)
+              self.assertAlmostEqual(c_vec[2], c_vec[4], places=6)
+#------------------------------------------------------------------------------#
+
+
+if __name__ == '__main__':
+   unittest.main()